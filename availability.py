@@ -0,0 +1,107 @@
+from datetime import datetime, time, timedelta
+from bookingIndex import to_date
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+
+def minutes(value):
+    return value.hour * 60 + value.minute
+
+def to_time(slot):
+    # The end of the day has no time() of its own, so ranges closing at 24:00 end at 23:59.
+    if slot >= SLOTS_PER_DAY:
+        return time(23, 59)
+    total = slot * SLOT_MINUTES
+    return time(total // 60, total % 60)
+
+def slot_mask(first, last):
+    return ((1 << (last - first)) - 1) << first
+
+class AvailabilityEngine:
+    # Each facility-day is a 96-bit integer with bit i set when the 15-minute slot starting at
+    # i * 15 minutes overlaps a booking. Bitmaps are derived from the booking index and cached
+    # until that day's schedule changes, so free-slot queries are a handful of bit operations.
+    # Slots held by requests awaiting approval count as occupied too.
+    def __init__(self, booking_cache, opening_hours=("00:00", "24:00"), booking_guard=None):
+        self.booking_cache = booking_cache
+        self.booking_guard = booking_guard
+        open_slot = self._parse_hour(opening_hours[0]) // SLOT_MINUTES
+        close_slot = self._parse_hour(opening_hours[1]) // SLOT_MINUTES
+        self.open_mask = slot_mask(open_slot, close_slot)
+        self._bitmaps = {}
+
+    @staticmethod
+    def _parse_hour(value):
+        hours, mins = map(int, value.split(":"))
+        return hours * 60 + mins
+
+    def occupancy(self, facility, date):
+        date = to_date(date)
+        bitmap = self._bitmap("bookings", self.booking_cache.index, facility, date)
+        if self.booking_guard is not None:
+            bitmap |= self._bitmap("holds", self.booking_guard.holds, facility, date)
+        return bitmap
+
+    def _bitmap(self, source, index, facility, date):
+        day = index.day(facility, date)
+        if day is None:
+            return 0
+        key = (source, facility, date)
+        cached = self._bitmaps.get(key)
+        if cached is not None and cached[0] is day and cached[1] == day.version:
+            return cached[2]
+        bitmap = 0
+        for start, end in zip(day.starts, day.ends):
+            first = minutes(start) // SLOT_MINUTES
+            last = -(-minutes(end) // SLOT_MINUTES)
+            bitmap |= slot_mask(first, last)
+        if len(self._bitmaps) > 4096:
+            self._bitmaps.clear()
+        self._bitmaps[key] = (day, day.version, bitmap)
+        return bitmap
+
+    def free_mask(self, facility, date, not_before=None):
+        free = ~self.occupancy(facility, date) & self.open_mask
+        if not_before is not None and to_date(date) == not_before.date():
+            now_slot = -(-minutes(not_before) // SLOT_MINUTES)
+            free &= ~slot_mask(0, now_slot)
+        return free
+
+    def free_slots(self, facility, date, not_before=None):
+        # Maximal free ranges on the day as (start, end) times.
+        free = self.free_mask(facility, date, not_before)
+        ranges = []
+        slot = 0
+        while free >> slot:
+            if not (free >> slot) & 1:
+                slot += ((free >> slot) & -(free >> slot)).bit_length() - 1
+                continue
+            run = (~(free >> slot) & -(~(free >> slot))).bit_length() - 1
+            ranges.append((to_time(slot), to_time(slot + run)))
+            slot += run
+        return ranges
+
+    def free_windows(self, facility, date, length_minutes, count, not_before=None):
+        # Non-overlapping windows of the requested length on one day, earliest first.
+        length = -(-length_minutes // SLOT_MINUTES)
+        free = self.free_mask(facility, date, not_before)
+        starts = free
+        for offset in range(1, length):
+            starts &= free >> offset
+        windows = []
+        while starts and len(windows) < count:
+            slot = (starts & -starts).bit_length() - 1
+            windows.append((to_time(slot), to_time(slot + length)))
+            starts &= ~slot_mask(0, slot + length)
+        return windows
+
+    def next_free_windows(self, facility, length_minutes, count, start=None, horizon_days=30):
+        start = start or datetime.now()
+        windows = []
+        for offset in range(horizon_days):
+            date = (start + timedelta(days=offset)).date()
+            for window in self.free_windows(facility, date, length_minutes, count - len(windows), start):
+                windows.append((date, *window))
+            if len(windows) >= count:
+                break
+        return windows
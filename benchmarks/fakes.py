@@ -0,0 +1,111 @@
+import asyncio, json, os, sys, tempfile, time
+from collections import Counter
+from datetime import datetime
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Chat, Message
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def bootstrap_env(user_count, admin_count=1):
+    # main.py and functions.py read their configuration at import time, so the benchmark
+    # environment has to be in place before they are imported.
+    state_dir = tempfile.mkdtemp(prefix="booking_bench_")
+    os.environ.update({
+        "TOKEN_API": "123456789:BENCHMARK-TOKEN",
+        "GSHEET_KEY_ID": "benchmark",
+        "GSHEET_CREDENTIALS": "{}",
+        "ALLOWED_USERS": json.dumps(list(range(1, user_count + admin_count + 1))),
+        "ADMIN_USERS": json.dumps({str(user_count + i): f"admin{i}" for i in range(1, admin_count + 1)}),
+        "STATE_BACKEND": "local",
+        "PENDING_STORE": "memory",
+        "WRITE_QUEUE_JOURNAL": os.path.join(state_dir, "pending_writes.json"),
+        "BOOKING_DB_PATH": os.path.join(state_dir, "bookings.db"),
+    })
+    return state_dir
+
+class FakeSession(BaseSession):
+    # Stands in for the aiohttp session behind aiogram's Bot: every API method answers
+    # locally after an optional delay, and calls are counted per method.
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = Counter()
+        self.durations = []
+        self.inline_messages = []
+        self._message_id = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        started = time.perf_counter()
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        markup = getattr(method, "reply_markup", None)
+        if markup is not None and getattr(markup, "inline_keyboard", None):
+            callbacks = [button.callback_data for row in markup.inline_keyboard for button in row]
+            self.inline_messages.append((getattr(method, "chat_id", None), getattr(method, "text", ""), callbacks))
+        result = True
+        if method.__returning__ is Message:
+            self._message_id += 1
+            result = Message(message_id=self._message_id, date=datetime.now(),
+                             chat=Chat(id=getattr(method, "chat_id", 0), type="private"), text=getattr(method, "text", None))
+        self.durations.append(time.perf_counter() - started)
+        return result
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+class FakeWorksheet:
+    # Synchronous like gspread; SheetStorage runs these calls on its thread pool, so the
+    # latency is a blocking sleep just as a real HTTP round-trip would be.
+    id = 0
+
+    def __init__(self, rows=None, latency=0.0):
+        self.rows = rows if rows is not None else [["User ID", "Facility", "Date", "Start Time", "End Time",
+                                                     "Time Period", "Email", "Name", "Contact Number"]]
+        self.latency = latency
+        self.calls = Counter()
+        self.revision = 0
+
+    def _call(self, name):
+        self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_all_values(self):
+        self._call("get_all_values")
+        return [list(map(str, row)) for row in self.rows]
+
+    def append_rows(self, rows, value_input_option=None):
+        self._call("append_rows")
+        self.rows.extend(list(map(str, row)) for row in rows)
+        self.revision += 1
+
+class FakeSpreadsheet:
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+
+    def get_lastUpdateTime(self):
+        self.worksheet._call("get_lastUpdateTime")
+        return str(self.worksheet.revision)
+
+    def batch_update(self, body):
+        self.worksheet._call("batch_update")
+        for request in body["requests"]:
+            span = request["deleteDimension"]["range"]
+            del self.worksheet.rows[span["startIndex"]:span["endIndex"]]
+        self.worksheet.revision += 1
+
+class FakeSheetClient:
+    def __init__(self, worksheet):
+        self._worksheet = worksheet
+        self._spreadsheet = FakeSpreadsheet(worksheet)
+        self.round_trips_saved = 0
+
+    def worksheet(self):
+        return self._worksheet
+
+    def spreadsheet(self):
+        return self._spreadsheet
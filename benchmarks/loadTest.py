@@ -0,0 +1,143 @@
+import argparse, asyncio, itertools, os, time, tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta
+from fakes import FakeSession, FakeSheetClient, FakeWorksheet, bootstrap_env
+
+SLOTS_PER_DAY = 12
+update_ids = itertools.count(1)
+
+def user_payload(user_id):
+    return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+
+def message_update(user_id, text):
+    update_id = next(update_ids)
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": int(time.time()), "chat": {"id": user_id, "type": "private"},
+        "from": user_payload(user_id), "text": text,
+    }}
+
+def callback_update(user_id, data):
+    update_id = next(update_ids)
+    return {"update_id": update_id, "callback_query": {
+        "id": str(update_id), "from": user_payload(user_id), "chat_instance": "benchmark", "data": data,
+        "message": {"message_id": update_id, "date": int(time.time()), "chat": {"id": user_id, "type": "private"}, "text": "calendar"},
+    }}
+
+class LoadTest:
+    def __init__(self, args, main, facility_list):
+        self.args = args
+        self.main = main
+        self.facility_list = facility_list
+        self.admin_id = args.users + 1
+        self.latencies = defaultdict(list)
+        self.completed = 0
+        self.approvals = {}
+        self._scanned = 0
+
+    async def step(self, name, payload):
+        started = time.perf_counter()
+        await self.main.dp.feed_raw_update(self.main.bot, payload)
+        self.latencies[name].append(time.perf_counter() - started)
+
+    def slot(self, user_id):
+        # Every user gets a distinct facility/day/hour so the flow never hits a conflict.
+        facility = self.facility_list[user_id % len(self.facility_list)]
+        index = user_id // len(self.facility_list)
+        day = datetime.now() + timedelta(days=1 + index // SLOTS_PER_DAY)
+        hour = 8 + index % SLOTS_PER_DAY
+        return facility, day, hour
+
+    def approval_for(self, email):
+        session = self.main.bot.session
+        while self._scanned < len(session.inline_messages):
+            chat_id, text, callbacks = session.inline_messages[self._scanned]
+            self._scanned += 1
+            for data in callbacks:
+                if data.startswith("approve_"):
+                    self.approvals[text.split("Email: ", 1)[-1].split("\n", 1)[0]] = data
+        return self.approvals.pop(email, None)
+
+    async def booking_flow(self, user_id):
+        from aiogram_calendar.schemas import SimpleCalAct, SimpleCalendarCallback
+        facility, day, hour = self.slot(user_id)
+        email = f"user{user_id}@example.com"
+        await self.step("new_booking", message_update(user_id, "New Booking"))
+        await self.step("facility", message_update(user_id, facility))
+        calendar_data = SimpleCalendarCallback(act=SimpleCalAct.day, year=day.year, month=day.month, day=day.day).pack()
+        await self.step("date", callback_update(user_id, calendar_data))
+        await self.step("start_time", message_update(user_id, f"{hour:02d}00"))
+        await self.step("end_time", message_update(user_id, f"{hour:02d}45"))
+        await self.step("email", message_update(user_id, email))
+        await self.step("name", message_update(user_id, f"User {user_id}"))
+        await self.step("contact_number", message_update(user_id, "91234567"))
+        await self.step("confirmation", message_update(user_id, "Yes"))
+        approval = self.approval_for(email)
+        if approval is None:
+            return
+        await self.step("approve", callback_update(self.admin_id, approval))
+        self.completed += 1
+
+    async def run(self):
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+
+        async def limited(user_id):
+            async with semaphore:
+                await self.booking_flow(user_id)
+
+        await asyncio.gather(*(limited(user_id) for user_id in range(1, self.args.users + 1)))
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000
+
+async def run(args):
+    bootstrap_env(args.users)
+    os.environ.setdefault("TELEGRAM_GLOBAL_RATE", str(args.telegram_rate))
+    os.environ.setdefault("TELEGRAM_PER_CHAT_INTERVAL", "0")
+    os.environ.setdefault("TELEGRAM_MAX_CONCURRENCY", "1000")
+    import main, functions
+    from dataList import facility_list
+    from metrics import metrics, TelegramMetricsMiddleware
+
+    worksheet = FakeWorksheet(latency=args.sheet_latency)
+    functions.sheet_storage.sheet_client = FakeSheetClient(worksheet)
+    main.bot.session = FakeSession(args.telegram_latency)
+    main.bot.session.middleware(TelegramMetricsMiddleware())
+    await main.sheet_mirror.sync()
+    await main.booking_cache.refresh(force=True)
+    main.bookings_ready.set()
+    main.sheet_mirror.start()
+
+    tracemalloc.start()
+    baseline = tracemalloc.take_snapshot()
+    load_test = LoadTest(args, main, facility_list)
+    started = time.perf_counter()
+    await load_test.run()
+    elapsed = time.perf_counter() - started
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await main.sheet_mirror.stop()
+
+    all_latencies = [value for values in load_test.latencies.values() for value in values]
+    print(f"{load_test.completed}/{args.users} bookings completed in {elapsed:.2f}s "
+          f"({load_test.completed / elapsed:.1f} bookings/s, {len(all_latencies) / elapsed:.0f} updates/s)")
+    print(f"{'step':<16}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, values in load_test.latencies.items():
+        print(f"{name:<16}{len(values):>8}{percentile(values, 0.5):>10.2f}{percentile(values, 0.99):>10.2f}")
+    print(f"{'all':<16}{len(all_latencies):>8}{percentile(all_latencies, 0.5):>10.2f}{percentile(all_latencies, 0.99):>10.2f}")
+    sheet_calls = sum(worksheet.calls.values())
+    print(f"Sheet calls: {dict(worksheet.calls)} ({sheet_calls / max(load_test.completed, 1):.3f} per booking)")
+    print(f"Telegram calls: {dict(main.bot.session.calls)}")
+    growth = sum(stat.size_diff for stat in after.compare_to(baseline, "filename"))
+    print(f"Slowest instrumented paths:\n{metrics.summary()}")
+    print(f"Memory growth: {growth / 1024:.0f} KiB ({growth / max(load_test.completed, 1):.0f} B per booking), peak {peak / 1024:.0f} KiB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive the NewBooking flow for many simulated users against fake Telegram and Sheets backends.")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=1000, help="users in flight at once")
+    parser.add_argument("--telegram-latency", type=float, default=0.02, help="seconds per fake Telegram API call")
+    parser.add_argument("--telegram-rate", type=float, default=100000, help="global Telegram send rate for the fan-out limiter")
+    parser.add_argument("--sheet-latency", type=float, default=0.2, help="seconds per fake Sheets API call")
+    asyncio.run(run(parser.parse_args()))
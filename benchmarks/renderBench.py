@@ -0,0 +1,60 @@
+import argparse, asyncio, time, tracemalloc
+from datetime import datetime, timedelta
+import fakes  # noqa: F401  (puts the repository root on sys.path)
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+from aiogram_calendar import SimpleCalendar
+from dataList import facility_list
+import rendering
+
+def booking_data(i):
+    day = datetime(2026, 1, 5) + timedelta(days=i % 30)
+    return {"facility": facility_list[i % len(facility_list)], "date": day, "start_time": "10:00", "end_time": "11:00",
+            "email": f"user{i}@example.com", "name": f"User {i}", "contact_number": "91234567",
+            "frequency": "weekly", "until": day + timedelta(weeks=8), "occurrences": [day + timedelta(weeks=n) for n in range(9)]}
+
+def rebuilt_menu():
+    return ReplyKeyboardMarkup(keyboard=[[KeyboardButton(text=btn) for btn in row] for row in (("New Booking", "Recurring Booking"), ("View Booking",))],
+                               resize_keyboard=True, one_time_keyboard=True)
+
+def rebuilt_facilities():
+    return ReplyKeyboardMarkup(keyboard=[[KeyboardButton(text=facility) for facility in facility_list[i : i + 3]] for i in range(0, len(facility_list), 3)],
+                               resize_keyboard=True, one_time_keyboard=True)
+
+def rendered_summary(data):
+    # Same output as rendering.render_summary, built from scratch on every call.
+    return rendering.render_summary.__wrapped__(rendering.summary_key(data))
+
+async def measure(name, func, iterations):
+    tracemalloc.start()
+    started = time.perf_counter()
+    for i in range(iterations):
+        result = func(i)
+        if asyncio.iscoroutine(result):
+            await result
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<28}{elapsed / iterations * 1e6:>10.2f}{peak / 1024:>12.1f}")
+    return elapsed
+
+async def run(args):
+    bookings = [booking_data(i) for i in range(args.bookings)]
+    # An approval renders the summary for the user and the admins about three times.
+    cases = [
+        ("menu", lambda i: rebuilt_menu(), lambda i: rendering.USER_MENU),
+        ("facility picker", lambda i: rebuilt_facilities(), lambda i: rendering.FACILITY_KEYBOARD),
+        ("summary x3", lambda i: [rendered_summary(bookings[i % len(bookings)]) for _ in range(3)],
+                       lambda i: [rendering.booking_summary(bookings[i % len(bookings)]) for _ in range(3)]),
+        ("calendar", lambda i: SimpleCalendar().start_calendar(), lambda i: rendering.calendar_markup()),
+    ]
+    print(f"{'case':<28}{'us/op':>10}{'peak KiB':>12}")
+    for name, rebuilt, cached in cases:
+        before = await measure(f"{name} (rebuilt)", rebuilt, args.iterations)
+        after = await measure(f"{name} (cached)", cached, args.iterations)
+        print(f"{'':<28}{before / after:>10.1f}x faster")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare rebuilding keyboards, summaries and calendars per update with the cached rendering layer.")
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--bookings", type=int, default=200, help="distinct bookings whose summaries are rendered")
+    asyncio.run(run(parser.parse_args()))
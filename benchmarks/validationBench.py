@@ -0,0 +1,45 @@
+import argparse, asyncio, random, time
+import fakes  # noqa: F401  (puts the repository root on sys.path)
+from email_validator import validate_email, EmailNotValidError
+from validation import EmailValidator, check_email_syntax
+
+DOMAINS = ("gmail.com", "outlook.com", "yahoo.com", "example.com", "u.nus.edu")
+
+def sample_emails(count, distinct):
+    # Users re-type the same few addresses across the view, cancel and booking flows.
+    addresses = [f"user{i}@{DOMAINS[i % len(DOMAINS)]}" for i in range(distinct)]
+    return [random.choice(addresses) for _ in range(count)]
+
+def legacy(email):
+    # The previous behaviour: email_validator's default deliverability check, a blocking DNS query.
+    try:
+        return validate_email(email).normalized
+    except EmailNotValidError:
+        return None
+
+async def measure(name, validate, emails):
+    started = time.perf_counter()
+    for email in emails:
+        result = validate(email)
+        if asyncio.iscoroutine(result):
+            await result
+    elapsed = time.perf_counter() - started
+    print(f"{name:<24}{len(emails):>8}{elapsed / len(emails) * 1e6:>12.1f}{elapsed:>10.3f}")
+
+async def run(args):
+    emails = sample_emails(args.emails, args.distinct)
+    print(f"{'mode':<24}{'emails':>8}{'us/email':>12}{'total s':>10}")
+    await measure("syntax", check_email_syntax.__wrapped__, emails)
+    await measure("syntax, memoised", EmailValidator().validate, emails)
+    if args.dns:
+        await measure("dns (legacy, blocking)", legacy, emails[: args.dns_emails])
+        await measure("dns async, memoised", EmailValidator(check_dns=True, dns_timeout=args.dns_timeout).validate, emails)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare offline, memoised and DNS-checked email validation.")
+    parser.add_argument("--emails", type=int, default=20000)
+    parser.add_argument("--distinct", type=int, default=500, help="distinct addresses among the validated emails")
+    parser.add_argument("--dns", action="store_true", help="also run the modes that query DNS (needs network)")
+    parser.add_argument("--dns-emails", type=int, default=50, help="emails validated in the legacy blocking mode")
+    parser.add_argument("--dns-timeout", type=float, default=2.0)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,70 @@
+import argparse, asyncio, random, time
+from datetime import datetime
+from fakes import FakeSession, bootstrap_env
+
+def start_update(update_id, user_id):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(datetime.now().timestamp()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "text": "/start",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        },
+    }
+
+async def run(args):
+    bootstrap_env(args.users)
+    from aiohttp.test_utils import TestClient, TestServer
+    import main
+    from webhook import build_app
+
+    main.bot.session = FakeSession(args.telegram_latency)
+    handled = 0
+    done = asyncio.Event()
+
+    async def count_handled(handler, event, data):
+        nonlocal handled
+        try:
+            return await handler(event, data)
+        finally:
+            handled += 1
+            if handled >= args.updates:
+                done.set()
+
+    # Registered after build_app so it sits inside the deduplicator and counts unique updates.
+    app = build_app(main.dp, main.bot, "/webhook", handle_in_background=args.parallel)
+    main.dp.update.outer_middleware(count_handled)
+    payloads = [start_update(i, random.randint(1, args.users)) for i in range(1, args.updates + 1)]
+    payloads += random.sample(payloads, int(len(payloads) * args.duplicates))
+    random.shuffle(payloads)
+
+    async with TestClient(TestServer(app)) as client:
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def post(payload):
+            async with semaphore:
+                response = await client.post("/webhook", json=payload)
+                response.release()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(post(payload) for payload in payloads))
+        posted = time.perf_counter() - started
+        await asyncio.wait_for(done.wait(), timeout=120)
+        elapsed = time.perf_counter() - started
+
+    print(f"Posted {len(payloads)} updates ({len(payloads) - args.updates} duplicates) in {posted:.2f}s")
+    print(f"Handled {handled} unique updates in {elapsed:.2f}s: {handled / elapsed:.0f} updates/s")
+    print(f"Telegram calls: {dict(main.bot.session.calls)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Post synthetic updates to the webhook app with a fake Bot session.")
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duplicates", type=float, default=0.05, help="fraction of updates re-posted to exercise deduplication")
+    parser.add_argument("--telegram-latency", type=float, default=0.05, help="seconds per fake Telegram API call")
+    parser.add_argument("--sequential", dest="parallel", action="store_false", help="process each update before answering the webhook")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,168 @@
+import asyncio, logging, time
+from bookingIndex import BookingIndex, booking_key
+from validation import normalise_email
+
+class BookingSnapshot:
+    # Rows are keyed by object identity so a cancellation removes one entry from each index
+    # instead of scanning every booking. Sheet rows are deleted by matching their content
+    # (see SheetMirror), not by position.
+    __slots__ = ("header", "records", "by_email", "by_user", "index", "revision", "loaded_at")
+
+    def __init__(self, rows, revision):
+        self.header = rows[0] if rows else []
+        self.records = {}
+        self.by_email = {}
+        self.by_user = {}
+        self.index = BookingIndex()
+        self.revision = revision
+        self.loaded_at = time.monotonic()
+        for row in rows[1:]:
+            self.add(row)
+
+    @property
+    def rows(self):
+        return [self.header, *self.records.values()]
+
+    def __contains__(self, row):
+        return id(row) in self.records
+
+    def add(self, row):
+        key = id(row)
+        self.records[key] = row
+        self.by_email.setdefault(normalise_email(row[6] if len(row) > 6 else ""), {})[key] = row
+        self.by_user.setdefault(str(row[0]) if row else "", {})[key] = row
+        try:
+            self.index.add(row)
+        except (IndexError, ValueError) as e:
+            logging.warning(f"Booking row {row} is not indexed for conflicts: {e}")
+
+    def remove(self, row):
+        key = id(row)
+        if self.records.pop(key, None) is None:
+            return False
+        for owners, owner in ((self.by_email, normalise_email(row[6] if len(row) > 6 else "")),
+                              (self.by_user, str(row[0]) if row else "")):
+            bookings = owners.get(owner)
+            if bookings is not None:
+                bookings.pop(key, None)
+                if not bookings:
+                    del owners[owner]
+        self.index.remove(row)
+        return True
+
+    def bookings_for_email(self, email):
+        return list(self.by_email.get(normalise_email(email), {}).values())
+
+    def bookings_for_user(self, user_id):
+        return list(self.by_user.get(str(user_id), {}).values())
+
+    def find(self, row):
+        # Locates the cached row that describes the same booking as one built elsewhere, e.g.
+        # the pending write of a row that has since been reloaded from the sheet.
+        key = booking_key(row)
+        email = row[6] if len(row) > 6 else ""
+        for existing in self.bookings_for_email(email):
+            if booking_key(existing) == key:
+                return existing
+        return None
+
+class BookingCache:
+    def __init__(self, booking_store, ttl=60, bus=None, poll_interval=5):
+        self.booking_store = booking_store
+        self.ttl = ttl
+        self.bus = bus
+        self.poll_interval = poll_interval
+        self._bus_version = None
+        self.snapshot = BookingSnapshot([], None)
+        self._replay = None
+        self._refresh_lock = asyncio.Lock()
+        self._task = None
+
+    @property
+    def rows(self):
+        return self.snapshot.rows
+
+    @property
+    def index(self):
+        return self.snapshot.index
+
+    def bookings_for_email(self, email):
+        return self.snapshot.bookings_for_email(email)
+
+    def bookings_for_user(self, user_id):
+        return self.snapshot.bookings_for_user(user_id)
+
+    async def refresh(self, force=False):
+        async with self._refresh_lock:
+            return await self._refresh(force)
+
+    async def _refresh(self, force):
+        # The store's revision counter is bumped by every write and every sheet import, including
+        # those of other workers sharing the database file, so an unchanged store is not reloaded.
+        revision = self.booking_store.revision()
+        if not force and revision == self.snapshot.revision:
+            self.snapshot.loaded_at = time.monotonic()
+            return False
+        self._replay = []
+        try:
+            rows = await asyncio.to_thread(self.booking_store.rows)
+            snapshot = await asyncio.to_thread(BookingSnapshot, rows, revision)
+            # Changes made by handlers while the new snapshot was being built are replayed
+            # onto it, then it replaces the old one in a single assignment.
+            for change, row in self._replay:
+                if change == "add":
+                    if row not in snapshot:
+                        snapshot.add(row)
+                elif row in snapshot:
+                    snapshot.remove(row)
+                else:
+                    existing = snapshot.find(row)
+                    if existing is not None:
+                        snapshot.remove(existing)
+            self.snapshot = snapshot
+        finally:
+            self._replay = None
+        logging.info(f"Booking cache refreshed with {len(rows) - 1} rows")
+        return True
+
+    def add(self, row):
+        if self._replay is not None:
+            self._replay.append(("add", row))
+        self.snapshot.add(row)
+
+    def remove(self, row):
+        if self._replay is not None:
+            self._replay.append(("remove", row))
+        return self.snapshot.remove(row)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        # Other workers bump the bus after mirroring to the sheet, which triggers an immediate
+        # reload here; otherwise the store revision is checked once per TTL.
+        interval = min(self.ttl, self.poll_interval) if self.bus is not None else self.ttl
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                version = await self.bus.version() if self.bus is not None else None
+                if version != self._bus_version:
+                    stale = self._bus_version is not None
+                    self._bus_version = version
+                    if stale:
+                        await self.refresh(force=True)
+                        continue
+                if time.monotonic() - self.snapshot.loaded_at >= self.ttl:
+                    await self.refresh()
+            except Exception as e:
+                logging.error(f"Background booking cache refresh failed: {e}")
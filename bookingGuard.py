@@ -0,0 +1,64 @@
+import asyncio, time, weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from bookingIndex import BookingIndex, to_date
+
+class BookingGuard:
+    # Serialises check-then-write on each (facility, date) and holds the slots of requests
+    # that are waiting for an admin, so a second request for the same slot is turned away
+    # before it ever reaches the approval queue.
+    def __init__(self, booking_cache, completed_size=10000):
+        self.booking_cache = booking_cache
+        self.completed_size = completed_size
+        self.holds = BookingIndex()
+        self._hold_rows = {}
+        self._completed = OrderedDict()
+        self._locks = weakref.WeakValueDictionary()
+
+    @asynccontextmanager
+    async def lock(self, facility, dates):
+        # Locks are always taken in sorted order so two overlapping series cannot deadlock.
+        keys = sorted({(facility, to_date(date)) for date in dates})
+        locks = []
+        for key in keys:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = asyncio.Lock()
+            locks.append(lock)
+        acquired = []
+        try:
+            for lock in locks:
+                await lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+    def find_conflict(self, facility, date, start, end):
+        conflict = self.booking_cache.index.find_conflict(facility, date, start, end)
+        if conflict is None:
+            conflict = self.holds.find_conflict(facility, date, start, end)
+        return conflict
+
+    def hold(self, booking_id, rows):
+        self._hold_rows[booking_id] = (rows, time.time())
+        for row in rows:
+            self.holds.add(row)
+
+    def release(self, booking_id):
+        rows, _ = self._hold_rows.pop(booking_id, ((), None))
+        for row in rows:
+            self.holds.remove(row)
+
+    def purge(self, before):
+        for booking_id in [key for key, (_, created_at) in self._hold_rows.items() if created_at < before]:
+            self.release(booking_id)
+
+    def is_completed(self, booking_id):
+        return booking_id in self._completed
+
+    def complete(self, booking_id):
+        self._completed[booking_id] = None
+        if len(self._completed) > self.completed_size:
+            self._completed.popitem(last=False)
@@ -0,0 +1,130 @@
+import bisect, logging
+from datetime import datetime
+from validation import normalise_email
+
+DATE_FORMAT = "%m/%d/%Y"
+TIME_FORMAT = "%H:%M"
+
+def to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return datetime.strptime(value, DATE_FORMAT).date()
+    return value
+
+class BookingRecord:
+    __slots__ = ("row", "facility", "date", "start", "end")
+
+    def __init__(self, row):
+        self.row = row
+        self.facility = row[1]
+        self.date = to_date(row[2])
+        self.start = datetime.strptime(row[3], TIME_FORMAT).time()
+        self.end = datetime.strptime(row[4], TIME_FORMAT).time()
+
+class DaySchedule:
+    # Bookings of one facility on one day, sorted by start time. max_ends[i] is the latest
+    # end time among records[0..i], which keeps overlap queries logarithmic even when the
+    # sheet holds manually entered overlapping rows.
+    __slots__ = ("starts", "ends", "max_ends", "records", "version")
+
+    def __init__(self):
+        self.version = 0
+        self.starts = []
+        self.ends = []
+        self.max_ends = []
+        self.records = []
+
+    def __len__(self):
+        return len(self.records)
+
+    def insert(self, record):
+        i = bisect.bisect_right(self.starts, record.start)
+        self.starts.insert(i, record.start)
+        self.ends.insert(i, record.end)
+        self.records.insert(i, record)
+        self.max_ends.insert(i, record.end)
+        self._fix_max_ends(i)
+        self.version += 1
+
+    def remove(self, row):
+        i = bisect.bisect_left(self.starts, datetime.strptime(row[3], TIME_FORMAT).time())
+        while i < len(self.records) and self.records[i].row is not row:
+            i += 1
+        if i == len(self.records):
+            return None
+        record = self.records.pop(i)
+        del self.starts[i], self.ends[i], self.max_ends[i]
+        self._fix_max_ends(i)
+        self.version += 1
+        return record
+
+    def find_conflict(self, start, end):
+        # Candidates start before the requested end; the first one whose running max end
+        # passes the requested start is the earliest overlapping booking.
+        i = bisect.bisect_left(self.starts, end)
+        j = bisect.bisect_right(self.max_ends, start, 0, i)
+        return self.records[j] if j < i else None
+
+    def _fix_max_ends(self, i):
+        running = self.max_ends[i - 1] if i > 0 else None
+        for k in range(i, len(self.ends)):
+            running = self.ends[k] if running is None or self.ends[k] > running else running
+            self.max_ends[k] = running
+
+class BookingIndex:
+    def __init__(self):
+        self._days = {}
+
+    @classmethod
+    def from_rows(cls, rows):
+        index = cls()
+        for row in rows:
+            try:
+                index.add(row)
+            except (IndexError, ValueError) as e:
+                logging.warning(f"Skipping unparsable booking row {row}: {e}")
+        return index
+
+    def __len__(self):
+        return sum(len(day) for day in self._days.values())
+
+    def add(self, row):
+        record = BookingRecord(row)
+        key = (record.facility, record.date)
+        day = self._days.get(key)
+        if day is None:
+            day = self._days[key] = DaySchedule()
+        day.insert(record)
+        return record
+
+    def remove(self, row):
+        try:
+            key = (row[1], to_date(row[2]))
+            day = self._days.get(key)
+            record = day.remove(row) if day is not None else None
+        except (IndexError, ValueError):
+            return None
+        if day is None:
+            return None
+        if not day:
+            del self._days[key]
+        return record
+
+    def day(self, facility, date):
+        return self._days.get((facility, to_date(date)))
+
+    def find_conflict(self, facility, date, start, end):
+        day = self.day(facility, date)
+        if day is None:
+            return None
+        return day.find_conflict(start, end)
+
+def booking_key(row):
+    # Cells come back from the sheet as formatted strings, so compare the identifying columns
+    # (facility, date, start, end, email) in parsed form rather than verbatim.
+    try:
+        return (str(row[1]), to_date(str(row[2])), datetime.strptime(str(row[3]), TIME_FORMAT).time(),
+                datetime.strptime(str(row[4]), TIME_FORMAT).time(), normalise_email(row[6]))
+    except (IndexError, ValueError):
+        return tuple(str(value) for value in row)
@@ -0,0 +1,211 @@
+import json, logging, os, sqlite3, threading
+from collections import Counter
+from datetime import datetime
+from bookingIndex import TIME_FORMAT, booking_key, to_date
+from validation import normalise_email
+
+def sheet_values(row):
+    # The sheet returns every cell as a string and pads rows to the widest one, so rows are
+    # compared in that form.
+    values = [str(value) for value in row]
+    while values and values[-1] == "":
+        values.pop()
+    return tuple(values)
+
+def row_day(row):
+    try:
+        return to_date(str(row[2])).isoformat()
+    except (IndexError, ValueError):
+        return None
+
+def row_times(row):
+    try:
+        return datetime.strptime(str(row[3]), TIME_FORMAT).time(), datetime.strptime(str(row[4]), TIME_FORMAT).time()
+    except (IndexError, ValueError):
+        return None
+
+class BookingConflict(Exception):
+    def __init__(self, row, existing):
+        super().__init__(f"Booking {row} overlaps {existing}")
+        self.row = row
+        self.existing = existing
+
+class BookingStore:
+    # Local system of record for bookings. Each change is committed together with an outbox
+    # entry, and SheetMirror replays the outbox to the booking sheet in the background, so a
+    # Sheets outage delays the mirror but never a booking.
+    def __init__(self, path="bookings.db"):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS bookings (id INTEGER PRIMARY KEY, facility TEXT, day TEXT, email TEXT, row TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS bookings_facility_day ON bookings (facility, day);
+            CREATE INDEX IF NOT EXISTS bookings_email ON bookings (email);
+            CREATE TABLE IF NOT EXISTS outbox (seq INTEGER PRIMARY KEY AUTOINCREMENT, op TEXT NOT NULL, row TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+        """)
+
+    @property
+    def _db(self):
+        # One connection per thread: imports, full loads and writes that may wait on another
+        # worker's lock run in worker threads, never inside the event loop's transaction.
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, isolation_level=None, timeout=10, check_same_thread=False)
+            with self._connections_lock:
+                self._connections.append(db)
+        return db
+
+    def _get_meta(self, name, default=None):
+        row = self._db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta(self, name, value):
+        self._db.execute("INSERT INTO meta (name, value) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+                         (name, json.dumps(value)))
+
+    def _bump(self):
+        self._set_meta("revision", self.revision() + 1)
+
+    def revision(self):
+        return self._get_meta("revision", 0)
+
+    def imported(self):
+        # Set by the first successful sheet import; until then an empty or partial store does not
+        # mean the slots are free.
+        return self._get_meta("imported", False)
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM bookings").fetchone()[0]
+
+    def rows(self):
+        return [self._get_meta("header", []), *(json.loads(row) for row, in self._db.execute("SELECT row FROM bookings ORDER BY id"))]
+
+    def bookings_for_email(self, email):
+        return [json.loads(row) for row, in self._db.execute("SELECT row FROM bookings WHERE email = ? ORDER BY id", (normalise_email(email),))]
+
+    def _insert(self, rows):
+        self._db.executemany("INSERT INTO bookings (facility, day, email, row) VALUES (?, ?, ?, ?)", [
+            (str(row[1]) if len(row) > 1 else None, row_day(row), normalise_email(row[6]) if len(row) > 6 else None, json.dumps(row))
+            for row in rows
+        ])
+
+    def _find(self, row):
+        key = booking_key(row)
+        for booking_id, stored in self._db.execute("SELECT id, row FROM bookings WHERE facility = ? AND day IS ?",
+                                                   (str(row[1]), row_day(row))):
+            if booking_key(json.loads(stored)) == key:
+                return booking_id
+        return None
+
+    def _check_free(self, rows):
+        for row in rows:
+            times = row_times(row)
+            if times is None:
+                continue
+            for stored, in self._db.execute("SELECT row FROM bookings WHERE facility = ? AND day IS ?", (str(row[1]), row_day(row))):
+                existing = json.loads(stored)
+                other = row_times(existing)
+                if other is not None and other[0] < times[1] and times[0] < other[1]:
+                    raise BookingConflict(row, existing)
+
+    def insert(self, rows):
+        # The overlap check runs inside the write transaction, so it is authoritative for every
+        # worker sharing this database file, whatever their in-memory caches have seen so far.
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._check_free(rows)
+            self._insert(rows)
+            self._db.executemany("INSERT INTO outbox (op, row) VALUES ('append', ?)", [(json.dumps(row),) for row in rows])
+            self._bump()
+
+    def delete(self, row):
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            booking_id = self._find(row)
+            if booking_id is None:
+                return False
+            self._db.execute("DELETE FROM bookings WHERE id = ?", (booking_id,))
+            self._db.execute("INSERT INTO outbox (op, row) VALUES ('delete', ?)", (json.dumps(row),))
+            self._bump()
+        return True
+
+    def outbox(self, limit=None):
+        query = "SELECT seq, op, row FROM outbox ORDER BY seq" + (" LIMIT ?" if limit else "")
+        return [(seq, op, json.loads(row)) for seq, op, row in self._db.execute(query, (limit,) if limit else ())]
+
+    def outbox_size(self):
+        return self._db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def ack(self, seqs):
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.executemany("DELETE FROM outbox WHERE seq = ?", [(seq,) for seq in seqs])
+
+    def in_flight(self):
+        return self._get_meta("in_flight", [])
+
+    def set_in_flight(self, seqs):
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._set_meta("in_flight", seqs)
+
+    def import_rows(self, values):
+        # Only called with an empty outbox, when the sheet should match the store exactly, so
+        # every difference is an edit made by hand in the sheet and the sheet wins.
+        header, sheet_rows = (list(values[0]), values[1:]) if values else ([], [])
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            if self.outbox_size():
+                return None
+            local = {}
+            for booking_id, row in self._db.execute("SELECT id, row FROM bookings ORDER BY id"):
+                local.setdefault(sheet_values(json.loads(row)), []).append(booking_id)
+            wanted = Counter(sheet_values(row) for row in sheet_rows if sheet_values(row))
+            removed = []
+            for values_key, ids in local.items():
+                extra = len(ids) - wanted.pop(values_key, 0)
+                if extra > 0:
+                    removed.extend(ids[-extra:])
+                elif extra < 0:
+                    wanted[values_key] = -extra
+            added = [list(values_key) for values_key, count in wanted.items() for _ in range(count)]
+            self._db.executemany("DELETE FROM bookings WHERE id = ?", [(booking_id,) for booking_id in removed])
+            self._insert(added)
+            if header != self._get_meta("header", []):
+                self._set_meta("header", header)
+            if not self.imported():
+                self._set_meta("imported", True)
+            if added or removed:
+                self._bump()
+        return len(added), len(removed)
+
+    def import_journal(self, path):
+        # Pending writes left by the earlier JSON write-behind journal become outbox entries.
+        try:
+            with open(path) as f:
+                journal = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not read pending writes journal {path}: {e}")
+            return 0
+        appends, deletes = journal.get("appends", []), journal.get("deletes", [])
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.executemany("INSERT INTO outbox (op, row) VALUES ('delete', ?)", [(json.dumps(row),) for row in deletes])
+            self._insert(appends)
+            self._db.executemany("INSERT INTO outbox (op, row) VALUES ('append', ?)", [(json.dumps(row),) for row in appends])
+            self._bump()
+        os.remove(path)
+        logging.info(f"Moved {len(appends) + len(deletes)} pending booking writes from {path} into the booking store")
+        return len(appends) + len(deletes)
+
+    def close(self):
+        with self._connections_lock:
+            for db in self._connections:
+                db.close()
+            self._connections.clear()
@@ -7,9 +7,12 @@ facility_list = [
     "Swimming Pool"
 ]
 
+opening_hours = ("07:00", "23:00")
+
 commands = [
     types.BotCommand(command="/start", description="Start the bot"),
     types.BotCommand(command="/new_booking", description="Create new booking"),
+    types.BotCommand(command="/recurring_booking", description="Create a weekly or daily booking series"),
     types.BotCommand(command="/view_booking", description="View your booking"),
     types.BotCommand(command="/cancel_booking", description="Cancel your booking"),
     types.BotCommand(command="/help", description="Get help"),
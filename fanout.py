@@ -0,0 +1,72 @@
+import asyncio, logging, time
+from aiogram.exceptions import TelegramRetryAfter
+
+class DeliveryResult:
+    __slots__ = ("chat_id", "ok", "result", "error")
+
+    def __init__(self, chat_id, ok, result=None, error=None):
+        self.chat_id = chat_id
+        self.ok = ok
+        self.result = result
+        self.error = error
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class FanOut:
+    # Telegram allows roughly 30 messages per second overall and one per second to the same
+    # chat; sends run concurrently up to those limits instead of one recipient at a time.
+    def __init__(self, global_rate=30, per_chat_interval=1.0, max_concurrency=30, max_retries=3):
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._chat_next = {}
+
+    async def send(self, chat_ids, send):
+        results = await asyncio.gather(*(self._deliver(chat_id, send) for chat_id in chat_ids))
+        failed = [result for result in results if not result.ok]
+        for result in failed:
+            logging.error(f"Error sending message to {result.chat_id}: {result.error}")
+        logging.info(f"Delivered {len(results) - len(failed)}/{len(results)} messages")
+        return results
+
+    async def _deliver(self, chat_id, send):
+        async with self._semaphore:
+            error = None
+            for _ in range(self.max_retries + 1):
+                await self._wait_turn(chat_id)
+                try:
+                    return DeliveryResult(chat_id, True, result=await send(chat_id))
+                except TelegramRetryAfter as e:
+                    error = e
+                    await asyncio.sleep(e.retry_after)
+                except Exception as e:
+                    return DeliveryResult(chat_id, False, error=e)
+            return DeliveryResult(chat_id, False, error=error)
+
+    async def _wait_turn(self, chat_id):
+        now = time.monotonic()
+        turn = max(now, self._chat_next.get(chat_id, 0))
+        self._chat_next[chat_id] = turn + self.per_chat_interval
+        if len(self._chat_next) > 10000:
+            self._chat_next = {chat: at for chat, at in self._chat_next.items() if at > now}
+        if turn > now:
+            await asyncio.sleep(turn - now)
+        await self.global_bucket.acquire()
@@ -1,23 +1,50 @@
-import re, os, json, gspread, uuid
+import asyncio, re, os, uuid
+from datetime import timedelta
 from aiogram import types, BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
-from email_validator import validate_email, EmailNotValidError
 from dotenv import load_dotenv
+from sheetClient import SheetClient
+from sheetStorage import SheetStorage
+from bookingStore import BookingStore
+from sheetMirror import SheetMirror
+from bookingCache import BookingCache
+from pendingStore import PendingStore
+from sharedState import build_shared_state
+from fanout import FanOut
+from principals import PrincipalRegistry
+from bookingGuard import BookingGuard
+from validation import EmailValidator
+from rendering import booking_summary, ADMIN_MENU, USER_MENU
 
 load_dotenv()
 
-ADMIN_USERS = json.loads(os.getenv("ADMIN_USERS"))
+principals = PrincipalRegistry(os.getenv("ALLOWED_USERS_FILE"), os.getenv("ADMIN_USERS_FILE"))
 GSHEET_KEY_ID = os.getenv("GSHEET_KEY_ID")
-gSheet_credentials = json.loads(os.getenv("GSHEET_CREDENTIALS"))
+sheet_client = SheetClient(os.getenv("GSHEET_CREDENTIALS"), GSHEET_KEY_ID)
+sheet_storage = SheetStorage(sheet_client, int(os.getenv("SHEETS_MAX_WORKERS", "4")), float(os.getenv("SHEETS_TIMEOUT", "30")))
+PENDING_TTL = float(os.getenv("PENDING_TTL", str(3 * 24 * 3600)))
+shared_state = build_shared_state(os.getenv("STATE_BACKEND", "local"), os.getenv("STATE_DB_PATH", "bot_state.db"), os.getenv("REDIS_URL"),
+                                  os.getenv("PENDING_STORE", "sqlite"), os.getenv("PENDING_DB_PATH", "pending_requests.db"), PENDING_TTL)
+booking_store = BookingStore(os.getenv("BOOKING_DB_PATH", "bookings.db"))
+booking_store.import_journal(os.getenv("WRITE_QUEUE_JOURNAL", "pending_writes.json"))
+sheet_mirror = SheetMirror(booking_store, sheet_storage, int(os.getenv("WRITE_BATCH_SIZE", "20")), float(os.getenv("WRITE_FLUSH_INTERVAL", "5")),
+                           float(os.getenv("SHEET_IMPORT_INTERVAL", "60")), shared_state.bus)
+booking_cache = BookingCache(booking_store, float(os.getenv("BOOKING_CACHE_TTL", "60")), shared_state.bus)
+booking_guard = BookingGuard(booking_cache)
+pending_store = PendingStore(shared_state.pending_backend, PENDING_TTL, on_purge=booking_guard.purge)
+bookings_ready = asyncio.Event()
+email_checker = EmailValidator(os.getenv("EMAIL_DNS_CHECK", "0") == "1", float(os.getenv("EMAIL_DNS_TIMEOUT", "2")))
+fanout = FanOut(float(os.getenv("TELEGRAM_GLOBAL_RATE", "30")), float(os.getenv("TELEGRAM_PER_CHAT_INTERVAL", "1")),
+                int(os.getenv("TELEGRAM_MAX_CONCURRENCY", "30")))
 
 class AccessControlMiddleware(BaseMiddleware):
-    def __init__(self, allowed_users):
+    def __init__(self, registry):
         super().__init__()
-        self.allowed_users = allowed_users
+        self.registry = registry
 
-    async def __call__(self, handler, event: types.Message, data):
-        if event.from_user.id not in self.allowed_users:
+    async def __call__(self, handler, event: types.Message | types.CallbackQuery, data):
+        if event.from_user.id not in self.registry.principals.allowed:
             print(
                 f"Unauthorized access denied for {event.from_user.username} with ID of: {event.from_user.id}"
             )
@@ -25,6 +52,34 @@ class AccessControlMiddleware(BaseMiddleware):
             return
         return await handler(event, data)
 
+class ReadinessMiddleware(BaseMiddleware):
+    # Handlers flagged with "bookings" read the booking cache, which is filled in the background
+    # after polling starts; until then they wait for it and tell the user why the reply is slow.
+    def __init__(self, ready, timeout=20):
+        super().__init__()
+        self.ready = ready
+        self.timeout = timeout
+
+    async def __call__(self, handler, event: types.Message | types.CallbackQuery, data):
+        if self.ready.is_set() or not get_flag(data, "bookings"):
+            return await handler(event, data)
+        await self.notify(event, data, "Bookings are still loading, this will only take a moment...")
+        try:
+            await asyncio.wait_for(self.ready.wait(), self.timeout)
+        except asyncio.TimeoutError:
+            # The handler will not run, so this is the query's only answer.
+            await event.answer("The bot is still starting up. Please try again in a minute.")
+            return
+        return await handler(event, data)
+
+    @staticmethod
+    async def notify(event, data, text):
+        # A callback query can only be answered once, and its handler does that itself.
+        if isinstance(event, types.CallbackQuery):
+            await data["bot"].send_message(event.from_user.id, text)
+        else:
+            await event.answer(text)
+
 class NewBooking(StatesGroup):
     user_id = State()
     facility = State()
@@ -36,6 +91,8 @@ class NewBooking(StatesGroup):
     name = State()
     contact_number = State()
     confirmation = State()
+    recurrence = State()
+    until = State()
 
 class BroadcastMessage(StatesGroup):
     user_id = State()
@@ -70,82 +127,48 @@ def is_valid_contact_number(contact_number):
     else:
         return False
 
-def is_valid_email(email):
-    try:
-        # Validate.
-        v = validate_email(email)
-        # Replace with normalized form.
-        email = v["email"]
-        return True
-    except EmailNotValidError as e:
-        # Email is not valid, exception message is human-readable
-        print(str(e))
-        return False
+def series_dates(start, until, frequency):
+    step = timedelta(days=7 if frequency == "weekly" else 1)
+    dates = []
+    date = start
+    while date.date() <= until.date():
+        dates.append(date)
+        date += step
+    return dates
+
+def booking_dates(data):
+    return data.get('occurrences') or [data['date']]
+
+def booking_rows(data):
+    return [
+        [data['user_id'], data['facility'], date.strftime("%m/%d/%Y"), data['start_time'].strftime("%H:%M"),
+         data['end_time'].strftime("%H:%M"), data['time_period'],  data['email'], data['name'], data['contact_number']]
+        for date in booking_dates(data)
+    ]
 
 async def send_booking_data_to_sheet(data):
-    gc = gspread.service_account_from_dict(gSheet_credentials)
-    sh = gc.open_by_key(GSHEET_KEY_ID)
-    worksheet = sh.worksheet("Booking_Details")
-    new_booking = [data['user_id'], data['facility'], data['date'].strftime("%m/%d/%Y"), data['start_time'].strftime("%H:%M"),
-                   data['end_time'].strftime("%H:%M"), data['time_period'],  data['email'], data['name'], data['contact_number']]
-    worksheet.append_row(new_booking, value_input_option="USER_ENTERED")
-
-async def reply_keyboard(message, text, buttons, one_time=True):
-    keyboard = ReplyKeyboardMarkup(
-        keyboard=[[KeyboardButton(text=btn) for btn in row] for row in buttons],
-        resize_keyboard=True,
-        one_time_keyboard=one_time
-    )
-    await message.reply(text, reply_markup=keyboard)
+    # A recurring series is stored in one transaction, so the mirror sends it to the sheet as a single append.
+    new_bookings = booking_rows(data)
+    await sheet_mirror.extend(new_bookings)
+    return new_bookings
 
 async def admin_menu(message):
-    await reply_keyboard(message, "Welcome Admin! What would you like to do?", [
-        ["New Booking"],
-        ["View Booking"],
-        ["Broadcast Message"]
-    ])
+    await message.reply("Welcome Admin! What would you like to do?", reply_markup=ADMIN_MENU)
 
 async def user_menu(message):
-    await reply_keyboard(message, "What would you like to do?", [
-        ["New Booking"],
-        ["View Booking"]
-    ])
+    await message.reply("What would you like to do?", reply_markup=USER_MENU)
 
 def print_summary(data):
-    day_of_week = data["date"].strftime("%A")
-    date = data['date'].strftime("%d/%m/%Y")
-    return (
-            f"Booking Details\n"
-            f"================\n"
-            f"Facility: {data['facility']}\n"
-            f"Date: {date} ({day_of_week})\n"
-            f"Start time: {data['start_time']}\n"
-            f"End time: {data['end_time']}\n"
-            f"Email: {data['email']}\n"
-            f"Name: {data['name']}\n"
-            f"Contact Number: {data['contact_number']}\n"
-    )
+    return booking_summary(data)
 
 def is_admin(user_id):
-    for key in ADMIN_USERS.keys():
-        key = int(key)
-        if user_id == key:
-            return True
-    return False
+    return user_id in principals.principals.admins
 
 def get_admin_id_username(user_id):
-    for key, value in ADMIN_USERS.items():
-        key = int(key)
-        if user_id == key:
-            admin_id = key
-            admin_name = value
-    return admin_id, admin_name
+    return user_id, principals.principals.admins.get(user_id)
 
 def all_admin_id():
-    admin_id_list = []
-    for key in ADMIN_USERS.keys():
-        admin_id_list.append(int(key))
-    return admin_id_list
+    return principals.principals.admin_ids
 
 
 
@@ -1,29 +1,46 @@
-import asyncio, logging, sys, os, gspread, json, uuid
+import asyncio, logging, sys, os, time
+# Taken before the heavier imports below so the logged time-to-first-update covers them too.
+STARTED_AT = time.perf_counter()
 from datetime import datetime, timedelta
 from aiogram import Bot, Dispatcher, types
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import CommandStart
 from aiogram_calendar import SimpleCalendar, SimpleCalendarCallback
+from rendering import FACILITY_KEYBOARD, YES_NO_KEYBOARD, FREQUENCY_KEYBOARD, approval_keyboard, calendar_markup
 from aiogram.fsm.context import FSMContext
 from dotenv import load_dotenv
 from aiogram.filters import Command
 
-from functions import (AccessControlMiddleware, NewBooking, BroadcastMessage, ViewBooking, CancelBooking, is_valid_time_format, is_valid_contact_number, 
-                       is_valid_email, reply_keyboard, admin_menu, user_menu, print_summary, is_admin, get_admin_id_username, all_admin_id, send_booking_data_to_sheet)
-from dataList import facility_list, commands
+from functions import (AccessControlMiddleware, ReadinessMiddleware, NewBooking, BroadcastMessage, ViewBooking, CancelBooking, is_valid_time_format, is_valid_contact_number, 
+                       email_checker, admin_menu, user_menu, print_summary, series_dates, is_admin, get_admin_id_username, all_admin_id, send_booking_data_to_sheet, booking_rows, booking_dates, sheet_client, sheet_storage, booking_store, sheet_mirror, booking_cache, pending_store, booking_guard, fanout, shared_state, principals, bookings_ready)
+from dataList import commands, opening_hours
+from availability import AvailabilityEngine
+from bookingStore import BookingConflict
+from metrics import metrics, InstrumentationMiddleware, InstrumentedStorage, TelegramMetricsMiddleware, FirstUpdateMiddleware, log_metrics
 
 load_dotenv()
-booking_requests = {}
 
 TOKEN_API = os.getenv("TOKEN_API")
-GSHEET_KEY_ID = os.getenv("GSHEET_KEY_ID")
-ALLOWED_USERS = json.loads(os.environ['ALLOWED_USERS'])
-gSheet_credentials = json.loads(os.getenv("GSHEET_CREDENTIALS"))
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+BOOKING_HORIZON_DAYS = int(os.getenv("BOOKING_HORIZON_DAYS", "365"))
+SLOT_SUGGESTION_MINUTES = int(os.getenv("SLOT_SUGGESTION_MINUTES", "60"))
+MAX_SERIES_SESSIONS = int(os.getenv("MAX_SERIES_SESSIONS", "60"))
+# Workers sharing one booking database should leave the sheet sync to one of them.
+SHEET_SYNC = os.getenv("SHEET_SYNC", "1") == "1"
+WARM_UP_RETRY_INTERVAL = float(os.getenv("WARM_UP_RETRY_INTERVAL", "30"))
 
 bot = Bot(token=TOKEN_API)
-dp = Dispatcher()
-
-dp.message.middleware(AccessControlMiddleware(ALLOWED_USERS))
+dp = Dispatcher(storage=InstrumentedStorage(shared_state.fsm_storage))
+availability = AvailabilityEngine(booking_cache, opening_hours, booking_guard)
+
+dp.message.middleware(InstrumentationMiddleware("message"))
+dp.callback_query.middleware(InstrumentationMiddleware("callback_query"))
+dp.message.middleware(AccessControlMiddleware(principals))
+dp.callback_query.middleware(AccessControlMiddleware(principals))
+dp.message.middleware(ReadinessMiddleware(bookings_ready, float(os.getenv("READY_TIMEOUT", "20"))))
+dp.callback_query.middleware(ReadinessMiddleware(bookings_ready, float(os.getenv("READY_TIMEOUT", "20"))))
+dp.update.outer_middleware(FirstUpdateMiddleware(STARTED_AT))
+bot.session.middleware(TelegramMetricsMiddleware())
 
 @dp.message(CommandStart())
 async def start_handler(message: types.Message):
@@ -46,15 +63,17 @@ async def broadcast_message_input(message: types.Message, state: FSMContext):
 async def broadcast_message_confirmation(message: types.Message, state: FSMContext):
     await state.update_data(message=message.text)
     await state.set_state(BroadcastMessage.confirmation)
-    await reply_keyboard(message, f"Broadcast message: {message.text}\n\nConfirm broadcast?", [["Yes", "No"]])
+    await message.reply(f"Broadcast message: {message.text}\n\nConfirm broadcast?", reply_markup=YES_NO_KEYBOARD)
 
 @dp.message(lambda message: message.text.lower() == "yes", BroadcastMessage.confirmation)
 async def broadcast_message_confirmation_positive(message: types.Message, state: FSMContext):
     data = await state.get_data()
     if is_admin(message.from_user.id):
-        for user_id in ALLOWED_USERS:
-            admin_name = get_admin_id_username(message.from_user.id)[1]
-            await bot.send_message(user_id, f"Broadcasted Message from {admin_name}:\n {data['message']}")
+        admin_name = get_admin_id_username(message.from_user.id)[1]
+        text = f"Broadcasted Message from {admin_name}:\n {data['message']}"
+        results = await fanout.send(principals.principals.allowed, lambda user_id: bot.send_message(user_id, text))
+        delivered = sum(result.ok for result in results)
+        await message.reply(f"Broadcast delivered to {delivered} of {len(results)} users.")
     else:
         await message.reply("You are not authorized to broadcast messages.")
     await state.clear()
@@ -62,38 +81,56 @@ async def broadcast_message_confirmation_positive(message: types.Message, state:
 
 @dp.message(lambda message: "new booking" in message.text.lower())
 async def newBooking(message: types.Message, state: FSMContext):
-    facility_kb = ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text=facility) for facility in facility_list[i : i + 3]]
-            for i in range(0, len(facility_list), 3)
-        ],
-        resize_keyboard=True,
-        one_time_keyboard=True,
-    )
-    await state.update_data(user_id=message.from_user.id)
+    await state.update_data(user_id=message.from_user.id, recurring=False, occurrences=None)
     await state.set_state(NewBooking.facility)
-    await message.reply("Which facility would you like to book?", reply_markup=facility_kb)
+    await message.reply("Which facility would you like to book?", reply_markup=FACILITY_KEYBOARD)
+
+@dp.message(lambda message: "recurring booking" in message.text.lower())
+async def recurringBooking(message: types.Message, state: FSMContext):
+    await newBooking(message, state)
+    await state.update_data(recurring=True)
 
 @dp.message(NewBooking.facility)
 async def newBooking_facility(message: types.Message, state: FSMContext):
     await state.update_data(facility=message.text)
     await state.set_state(NewBooking.date)
-    await message.answer("Please select the date of booking",reply_markup=await SimpleCalendar().start_calendar())
+    await message.answer("Please select the date of booking",reply_markup=await calendar_markup())
 
-@dp.callback_query(SimpleCalendarCallback.filter(), NewBooking.date)
+@dp.callback_query(SimpleCalendarCallback.filter(), NewBooking.date, flags={"bookings": True})
 async def newBooking_date(call: CallbackQuery, callback_data: dict, state: FSMContext):
     calendar = SimpleCalendar()
-    calendar.set_dates_range(datetime.now() - timedelta(days=1), datetime(2024, 12, 31))
+    calendar.set_dates_range(datetime.now() - timedelta(days=1), datetime.now() + timedelta(days=BOOKING_HORIZON_DAYS))
     selected, date = await calendar.process_selection(call, callback_data)
     if selected:
         await state.update_data(date=date)
         await state.set_state(NewBooking.start_time)
-        await call.message.reply(f'You selected {date.strftime("%d/%m/%Y")}. \nPlease enter the start time of booking (hhmm)')
+        data = await state.get_data()
+        free_slot_kb = free_slot_keyboard(data['facility'], date)
+        if free_slot_kb is None:
+            await call.message.reply(f'You selected {date.strftime("%d/%m/%Y")}. \nPlease enter the start time of booking (hhmm)')
+        else:
+            await call.message.reply(f'You selected {date.strftime("%d/%m/%Y")}. \nPick a free slot below or enter the start time of booking (hhmm)',
+                                     reply_markup=free_slot_kb)
+
+def free_slot_keyboard(facility, date):
+    windows = availability.free_windows(facility, date, SLOT_SUGGESTION_MINUTES, 8, datetime.now())
+    if not windows:
+        return None
+    buttons = [InlineKeyboardButton(text=f"{start:%H:%M}-{end:%H:%M}", callback_data=f"slot_{start:%H%M}_{end:%H%M}") for start, end in windows]
+    return InlineKeyboardMarkup(inline_keyboard=[buttons[i : i + 2] for i in range(0, len(buttons), 2)])
+
+@dp.callback_query(lambda c: c.data.startswith('slot_'), NewBooking.start_time, flags={"bookings": True})
+async def newBooking_slot(call: CallbackQuery, state: FSMContext):
+    _, start_time, end_time = call.data.split("_")
+    await state.update_data(start_time=datetime.strptime(start_time, "%H%M").time())
+    data = await state.get_data()
+    data['end_time'] = datetime.strptime(end_time, "%H%M").time()
+    await call.answer()
+    await accept_time_slot(call.message, state, data)
 
 @dp.message(NewBooking.start_time)
 async def newBooking_startTime(message: types.Message, state: FSMContext):
     data = await state.get_data()
-    print(datetime.now().date(), type(datetime.now().date()))
     if is_valid_time_format(message.text):
         data['start_time'] = datetime.strptime(message.text, "%H%M").time()
         if data['date'].date() == datetime.now().date() and data['start_time'] < datetime.now().time():
@@ -109,7 +146,7 @@ async def newBooking_startTime(message: types.Message, state: FSMContext):
         await message.reply("Invalid time format. Please enter the start time of booking (hhmm)")
 
 
-@dp.message(NewBooking.end_time)
+@dp.message(NewBooking.end_time, flags={"bookings": True})
 async def newBooking_endTime(message: types.Message, state: FSMContext):
     data = await state.get_data()
     if is_valid_time_format(message.text):
@@ -118,26 +155,82 @@ async def newBooking_endTime(message: types.Message, state: FSMContext):
                 await message.reply("End time cannot be before the start time or the same as the start time. Please re-enter the end time.")
                 return
 
-        await state.update_data(end_time=data['end_time'])
-        await state.update_data(time_period=f"{data['start_time'].strftime('%H:%M')}-{data['end_time'].strftime('%H:%M')}")
-        await state.set_state(NewBooking.time_period)
-        await state.set_state(NewBooking.email)
-
-        for values in existing_booking[1:]:
-            if data["facility"] == values[1] and data['date'].strftime("%m/%d/%Y") == values[2]:
-                if data["start_time"] < datetime.strptime(values[4], "%H:%M").time() and data['end_time'] > datetime.strptime(values[3], "%H:%M").time():
-                    await message.reply(f"{data['facility']} has been already booked by {values[7]} on {values[2]}, from {values[3]} to {values[4]}. Please select another time slot.")
-                    await state.set_state(NewBooking.date)
-                    await message.reply("Please select another date or time of booking", reply_markup=await SimpleCalendar().start_calendar())
-                    return
-        await message.reply("Please enter your email")
+        await accept_time_slot(message, state, data)
     else:
         await message.reply("Invalid time format. Please enter the end time of booking (hhmm)")
 
+async def accept_time_slot(message, state, data):
+    await state.update_data(end_time=data['end_time'])
+    await state.update_data(time_period=f"{data['start_time'].strftime('%H:%M')}-{data['end_time'].strftime('%H:%M')}")
+    await state.set_state(NewBooking.time_period)
+    if data.get('recurring'):
+        # Every date of the series is checked together once the frequency and end date are known.
+        await state.set_state(NewBooking.recurrence)
+        await message.reply("How often should this booking repeat?", reply_markup=FREQUENCY_KEYBOARD)
+        return
+    await state.set_state(NewBooking.email)
+
+    with metrics.timer("bot_step_seconds", step="conflict_check"):
+        conflict = booking_guard.find_conflict(data["facility"], data['date'], data["start_time"], data['end_time'])
+    if conflict is not None:
+        values = conflict.row
+        await message.reply(f"{data['facility']} has been already booked by {values[7]} on {values[2]}, from {values[3]} to {values[4]}. Please select another time slot.")
+        free_ranges = ", ".join(f"{start:%H:%M}-{end:%H:%M}" for start, end in availability.free_slots(data['facility'], data['date'], datetime.now()))
+        if free_ranges:
+            await message.reply(f"{data['facility']} is still free on {data['date'].strftime('%d/%m/%Y')} at: {free_ranges}")
+        await state.set_state(NewBooking.date)
+        await message.reply("Please select another date or time of booking", reply_markup=await calendar_markup())
+        return
+    await message.reply("Please enter your email")
+
+@dp.message(NewBooking.recurrence)
+async def newBooking_recurrence(message: types.Message, state: FSMContext):
+    frequency = message.text.lower()
+    if frequency not in ("weekly", "daily"):
+        await message.reply("Please choose how often the booking repeats.", reply_markup=FREQUENCY_KEYBOARD)
+        return
+    await state.update_data(frequency=frequency)
+    await state.set_state(NewBooking.until)
+    await message.reply("Please enter the date of the last session (dd/mm/yyyy)")
+
+@dp.message(NewBooking.until, flags={"bookings": True})
+async def newBooking_until(message: types.Message, state: FSMContext):
+    data = await state.get_data()
+    try:
+        until = datetime.strptime(message.text.strip(), "%d/%m/%Y")
+    except ValueError:
+        await message.reply("Invalid date format. Please enter the date of the last session (dd/mm/yyyy)")
+        return
+    if until.date() < data['date'].date() or until > datetime.now() + timedelta(days=BOOKING_HORIZON_DAYS):
+        await message.reply(f"The last session must be between {data['date'].strftime('%d/%m/%Y')} and "
+                            f"{(datetime.now() + timedelta(days=BOOKING_HORIZON_DAYS)).strftime('%d/%m/%Y')}. Please re-enter the date.")
+        return
+    dates = series_dates(data['date'], until, data['frequency'])
+    if len(dates) > MAX_SERIES_SESSIONS:
+        await message.reply(f"A series can have at most {MAX_SERIES_SESSIONS} sessions. Please enter an earlier end date.")
+        return
+
+    with metrics.timer("bot_step_seconds", step="series_conflict_check"):
+        conflicts = [(date, booking_guard.find_conflict(data['facility'], date, data['start_time'], data['end_time'])) for date in dates]
+    occurrences = [date for date, conflict in conflicts if conflict is None]
+    clashes = [f"{date.strftime('%d/%m/%Y')} (booked by {conflict.row[7]}, {conflict.row[3]}-{conflict.row[4]})"
+               for date, conflict in conflicts if conflict is not None]
+    if not occurrences:
+        await message.reply(f"{data['facility']} is already booked at this time on every date of the series. Please select another time slot.")
+        await state.set_state(NewBooking.date)
+        await message.reply("Please select another date or time of booking", reply_markup=await calendar_markup())
+        return
+    if clashes:
+        await message.reply("These dates are already taken and will be skipped:\n" + "\n".join(clashes))
+    await state.update_data(until=until, occurrences=occurrences)
+    await state.set_state(NewBooking.email)
+    await message.reply(f"{len(occurrences)} sessions are available. Please enter your email")
+
 @dp.message(NewBooking.email)
 async def newBooking_email(message: types.Message, state: FSMContext):
-    if is_valid_email(message.text):
-        await state.update_data(email=message.text)
+    email = await email_checker.validate(message.text)
+    if email:
+        await state.update_data(email=email)
         await state.set_state(NewBooking.name)
         await message.reply("Please enter your name")
     else:
@@ -155,72 +248,139 @@ async def newBooking_contactNumber(message: types.Message, state: FSMContext):
         await state.update_data(contact_number=message.text)
         data = await state.get_data()
         await state.set_state(NewBooking.confirmation)
-        await message.reply(print_summary(data)+"\nConfirm booking?",
-            reply_markup=ReplyKeyboardMarkup(
-                keyboard=[[KeyboardButton(text="Yes"), KeyboardButton(text="No")]],
-                resize_keyboard=True,
-                one_time_keyboard=True,
-            ),
-        )
+        await message.reply(print_summary(data)+"\nConfirm booking?", reply_markup=YES_NO_KEYBOARD)
     else:
         await message.reply("Invalid contact number. Please enter a valid contact number")
 
-@dp.message(lambda message: message.text.lower() == "yes", NewBooking.confirmation)
+@dp.message(lambda message: message.text.lower() == "yes", NewBooking.confirmation, flags={"bookings": True})
 async def newBooking_confirmation(message: types.Message, state: FSMContext):
     data = await state.get_data() 
-    booking_id = str(uuid.uuid4())
-    booking_requests[booking_id] = {"data": data, "processed": False, "message_ids": {}}
     booking_request = (f"New booking request:\n\n"+print_summary(data)+"\n\n")
 
     if not is_admin(message.from_user.id):
-        inline_kb = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="Approve", callback_data=f"approve_{booking_id}"),
-            InlineKeyboardButton(text="Reject", callback_data=f"reject_{booking_id}")],
-        ])
+        # The slot is re-checked and held under the (facility, date) lock, so two users who
+        # passed the earlier check for the same slot cannot both reach the approval queue.
+        async with booking_guard.lock(data['facility'], booking_dates(data)):
+            clash = first_conflict(data)
+            if clash is None:
+                request = await pending_store.create(data)
+                booking_id = request.booking_id
+                booking_guard.hold(booking_id, booking_rows(data))
+        if clash is not None:
+            await message.reply(clash)
+            await state.clear()
+            await start_handler(message)
+            return
+        inline_kb = approval_keyboard(booking_id)
 
-        for admin_id in all_admin_id():
-            try:
-                sent_message = await bot.send_message(admin_id, booking_request, reply_markup=inline_kb)
-                booking_requests[booking_id]["message_ids"][admin_id] = sent_message.message_id
-            except Exception as e:
-                logging.error(f"Error sending message to admin {admin_id}: {e}")
+        results = await fanout.send(all_admin_id(), lambda admin_id: bot.send_message(admin_id, booking_request, reply_markup=inline_kb))
+        request.message_ids = {result.chat_id: result.result.message_id for result in results if result.ok}
+        if not await pending_store.save(request):
+            # An admin handled the request while it was still being sent out; that handler did
+            # not know these message ids, so their buttons are removed here.
+            await fanout.send(list(request.message_ids), lambda admin_id: bot.edit_message_reply_markup(admin_id, request.message_ids[admin_id]))
 
         await message.reply(f"Your booking request has been sent for approval. You will be notified once it is reviewed.\n\n"+print_summary(data))
     else:
         try:
-            sent_message = await bot.send_message(data['user_id'], "Your booking request has been approved.")
-            await send_booking_data_to_sheet(data)
+            async with booking_guard.lock(data['facility'], booking_dates(data)):
+                clash = await write_booking(data)
+            if clash is not None:
+                await message.reply(clash)
+            else:
+                await bot.send_message(data['user_id'], "Your booking request has been approved.")
         except Exception as e:
             logging.error(f"Error sending message to user {data['user_id']}: {e}")  
     
     await state.clear()
     await start_handler(message) 
 
-@dp.callback_query(lambda c: c.data.startswith('approve_'))
+def conflict_message(data, values):
+    return (f"{data['facility']} has been already booked by {values[7]} on {values[2]}, "
+            f"from {values[3]} to {values[4]}. Please make a new booking for another time slot.")
+
+def first_conflict(data):
+    for date in booking_dates(data):
+        conflict = booking_guard.find_conflict(data['facility'], date, data['start_time'], data['end_time'])
+        if conflict is not None:
+            return conflict_message(data, conflict.row)
+    return None
+
+async def write_booking(data):
+    # The in-memory check catches most clashes cheaply; the store re-checks inside its write
+    # transaction, which also covers bookings other workers made since this cache was loaded.
+    clash = first_conflict(data)
+    if clash is not None:
+        return clash
+    try:
+        add_bookings(await send_booking_data_to_sheet(data))
+    except BookingConflict as e:
+        return conflict_message(data, e.existing)
+    return None
+
+async def notify_admin(admin_id, message_id, text):
+    if message_id is not None:
+        await bot.edit_message_reply_markup(admin_id, message_id)
+    return await bot.send_message(admin_id, text)
+
+@dp.callback_query(lambda c: c.data.startswith('approve_'), flags={"bookings": True})
 async def newBooking_approve(callback_query: CallbackQuery):
     booking_id = callback_query.data.split("_")[1]
-    booking_requests[booking_id]["processed"] = True
-    await bot.send_message(booking_requests[booking_id]["data"]['user_id'], f"Your booking request has been approved by {get_admin_id_username(callback_query.from_user.id)[1]}.\n\n{print_summary(booking_requests[booking_id]['data'])}")  
-    await send_booking_data_to_sheet(booking_requests[booking_id]["data"])
-
-    for admin_id in all_admin_id():
+    if booking_guard.is_completed(booking_id):
+        await callback_query.answer("This booking request has already been processed or has expired.")
+        return
+    request = await pending_store.get(booking_id)
+    if request is None:
+        await callback_query.answer("This booking request has already been processed or has expired.")
+        return
+    data = request.data
+    # Claiming the request, re-validating the slot and queueing the write happen under one lock,
+    # so of two approvals racing for the same slot exactly one is written.
+    async with booking_guard.lock(data['facility'], booking_dates(data)):
+        if await pending_store.pop(booking_id) is None:
+            await callback_query.answer("This booking request has already been processed or has expired.")
+            return
+        booking_guard.release(booking_id)
         try:
-            await bot.edit_message_reply_markup(admin_id, booking_requests[booking_id]["message_ids"][admin_id])
-            await bot.send_message(admin_id, f"Booking request approved by {get_admin_id_username(callback_query.from_user.id)[1]} for {booking_requests[booking_id]['data']['name']}.\n\n{print_summary(booking_requests[booking_id]['data'])}")
+            clash = await write_booking(data)
         except Exception as e:
-            logging.error(f"Error editing message for admin {admin_id}: {e}")
+            # e.g. the booking database stayed locked by another worker: the request goes back
+            # to the queue with its hold, so the approval can simply be retried.
+            logging.error(f"Could not write approved booking {booking_id}: {e}")
+            booking_guard.hold(booking_id, booking_rows(data))
+            await pending_store.restore(request)
+            await callback_query.answer("The booking could not be saved. Please try approving it again.")
+            return
+        if clash is None:
+            booking_guard.complete(booking_id)
+    admin_name = get_admin_id_username(callback_query.from_user.id)[1]
+    summary = print_summary(data)
+    if clash is not None:
+        await callback_query.answer("This slot has been taken since the request was made.")
+        await bot.send_message(data['user_id'], f"Your booking request could not be approved because the slot is no longer available.\n\n{summary}")
+        text = f"Booking request for {data['name']} could not be approved by {admin_name}: the slot is no longer available.\n\n{summary}"
+        await fanout.send(all_admin_id(), lambda admin_id: notify_admin(admin_id, request.message_ids.get(admin_id), text))
+        return
+    await bot.send_message(data['user_id'], f"Your booking request has been approved by {admin_name}.\n\n{summary}")  
+
+    text = f"Booking request approved by {admin_name} for {data['name']}.\n\n{summary}"
+    await fanout.send(all_admin_id(), lambda admin_id: notify_admin(admin_id, request.message_ids.get(admin_id), text))
 
-@dp.callback_query(lambda c: c.data.startswith('reject_'))
+@dp.callback_query(lambda c: c.data.startswith('reject_'), flags={"bookings": True})
 async def newBooking_reject(callback_query: CallbackQuery):
     booking_id = callback_query.data.split("_")[1]
-    booking_requests[booking_id]["processed"] = True
-    await bot.send_message(booking_requests[booking_id]["data"]['user_id'], f"Your booking request has been rejected by {get_admin_id_username(callback_query.from_user.id)[1]}.\n\n{print_summary(booking_requests[booking_id]['data'])}")
-    for admin_id in all_admin_id():
-        try:
-            await bot.edit_message_reply_markup(admin_id, booking_requests[booking_id]["message_ids"][admin_id])
-            await bot.send_message(admin_id, f"Booking request approved by {get_admin_id_username(callback_query.from_user.id)[1]} for {booking_requests[booking_id]['data']['name']}.\n\n{print_summary(booking_requests[booking_id]['data'])}")
-        except Exception as e:
-            logging.error(f"Error editing message for admin {admin_id}: {e}")
+    request = await pending_store.pop(booking_id)
+    if request is None:
+        await callback_query.answer("This booking request has already been processed or has expired.")
+        return
+    booking_guard.release(booking_id)
+    booking_guard.complete(booking_id)
+    data = request.data
+    admin_name = get_admin_id_username(callback_query.from_user.id)[1]
+    summary = print_summary(data)
+    await bot.send_message(data['user_id'], f"Your booking request has been rejected by {admin_name}.\n\n{summary}")
+    text = f"Booking request rejected by {admin_name} for {data['name']}.\n\n{summary}"
+    await fanout.send(all_admin_id(), lambda admin_id: notify_admin(admin_id, request.message_ids.get(admin_id), text))
 
 @dp.message(lambda message: message.text.lower() == "no", NewBooking.confirmation)
 async def newBooking_confirmation_negative(message: types.Message, state: FSMContext):
@@ -232,14 +392,15 @@ async def viewBooking_emailInput(message: types.Message, state: FSMContext):
     await state.set_state(ViewBooking.email)
     await message.reply(f'Please enter your email to view your booking')
 
-@dp.message(ViewBooking.email)
+@dp.message(ViewBooking.email, flags={"bookings": True})
 async def viewBooking_emailProcessing(message: types.Message, state: FSMContext):
-    email = message.text
-    if not is_valid_email(email):
+    email = await email_checker.validate(message.text)
+    if not email:
         await message.reply("Invalid email. Please enter a valid email")
         return
     
-    user_bookings = [row for row in existing_booking[1:] if row[6] == email]  
+    with metrics.timer("bot_step_seconds", step="email_lookup"):
+        user_bookings = booking_cache.bookings_for_email(email)
     if not user_bookings:
         await message.reply("No bookings found for this email.")
     else:
@@ -257,14 +418,14 @@ async def cancelBooking_emailInput(message: types.Message, state: FSMContext):
     await state.set_state(CancelBooking.email)
     await message.reply("Please enter your email to view and cancel your bookings")
 
-@dp.message(CancelBooking.email)
+@dp.message(CancelBooking.email, flags={"bookings": True})
 async def cancelBooking_emailProcessing(message: types.Message, state: FSMContext):
-    email = message.text
-    if not is_valid_email(email):
+    email = await email_checker.validate(message.text)
+    if not email:
         await message.reply("Invalid email. Please enter a valid email")
         return
-    existing_booking = worksheet.get_all_values()
-    user_bookings = [row for row in existing_booking[1:] if row[6] == email]
+    with metrics.timer("bot_step_seconds", step="email_lookup"):
+        user_bookings = booking_cache.bookings_for_email(email)
     if not user_bookings:
         await message.reply("No bookings found for this email.")
         await state.clear()
@@ -280,7 +441,7 @@ async def cancelBooking_emailProcessing(message: types.Message, state: FSMContex
     await state.set_state(CancelBooking.booking_to_cancel)
     await message.reply("Select a booking to cancel:", reply_markup=cancel_kb)
 
-@dp.message(CancelBooking.booking_to_cancel)
+@dp.message(CancelBooking.booking_to_cancel, flags={"bookings": True})
 async def cancelBooking_bookingToCancel(message: types.Message, state: FSMContext):
     try:
         selected_booking = message.text.replace("Cancel ", "").split(" on ")
@@ -297,12 +458,12 @@ async def cancelBooking_bookingToCancel(message: types.Message, state: FSMContex
     email = (await state.get_data()).get('email')
     booking_found = False
     
-    for i, row in enumerate(existing_booking):
+    for row in booking_cache.bookings_for_email(email):
         if (    
-            row[1] == facility and row[2] == date and row[3] == start_time and row[4] == end_time and row[6] == email
+            row[1] == facility and row[2] == date and row[3] == start_time and row[4] == end_time
         ):
-            worksheet.delete_rows(i + 1)
-            existing_booking.pop(i)
+            booking_cache.remove(row)
+            await sheet_mirror.delete(row)
             booking_found = True
             break
     
@@ -314,6 +475,10 @@ async def cancelBooking_bookingToCancel(message: types.Message, state: FSMContex
     await state.clear()
     await start_handler(message)
 
+def add_bookings(rows):
+    for row in rows:
+        booking_cache.add(row)
+
 async def help_handler(message: types.Message):
     await message.answer(f"This is the help handler")
 
@@ -327,22 +492,81 @@ async def end_handler(message: types.Message):
         f"Please type /start to start again."
     )
 
+async def warm_up():
+    # Runs alongside polling. Handlers that read bookings wait until the store holds a
+    # successful sheet import: a fresh dyno filesystem starts with an empty bookings.db, and
+    # serving that would pass every slot as free. A store imported on an earlier run is served
+    # at once; otherwise the import is retried (or, without SHEET_SYNC, awaited from the worker
+    # that runs it) until it succeeds.
+    started = time.perf_counter()
+    synced = False
+    while True:
+        try:
+            if SHEET_SYNC and not booking_store.imported():
+                await sheet_mirror.sync()
+                synced = True
+            if booking_store.imported():
+                await booking_cache.refresh(force=True)
+                break
+        except Exception as e:
+            logging.error(f"Booking warm-up failed: {e}")
+        logging.warning(f"Bookings have not been imported from the sheet yet, retrying in {WARM_UP_RETRY_INTERVAL}s")
+        await asyncio.sleep(WARM_UP_RETRY_INTERVAL)
+    bookings_ready.set()
+    if SHEET_SYNC:
+        try:
+            if not synced:
+                await sheet_mirror.sync()
+                await booking_cache.refresh(force=True)
+        except Exception as e:
+            logging.error(f"Booking sheet sync failed: {e}")
+        sheet_mirror.start()
+    booking_cache.start()
+    logging.info(f"{len(booking_cache.rows) - 1} bookings ready {time.perf_counter() - started:.2f}s after polling started")
+    try:
+        await bot.set_my_commands(commands)
+    except Exception as e:
+        logging.warning(f"Could not register bot commands: {e}")
+
 async def main() -> None:
-    global worksheet, existing_booking
-    gc = gspread.service_account_from_dict(gSheet_credentials)
-    sh = gc.open_by_key(GSHEET_KEY_ID)
-    worksheet = sh.worksheet("Booking_Details")
-    existing_booking = worksheet.get_all_values()
-    logging.info("Existing bookings fetched and stored in memory")
     dp.message.register(broadcast_message_input, Command(commands=["broadcast_message"]))
     dp.message.register(newBooking, Command(commands=["new_booking"]))
+    dp.message.register(recurringBooking, Command(commands=["recurring_booking"]))
     dp.message.register(viewBooking_emailInput, Command(commands=["view_booking"]))
     dp.message.register(cancelBooking_emailInput, Command(commands=["cancel_booking"]))
     dp.message.register(help_handler, Command(commands=["help"]))
     dp.message.register(about_handler, Command(commands=["about"]))
     dp.message.register(end_handler, Command(commands=["end"]))
-    await bot.set_my_commands(commands)
-    await dp.start_polling(bot)
+    warm_up_task = asyncio.create_task(warm_up())
+    pending_store.start()
+    principals.start(float(os.getenv("PRINCIPALS_RELOAD_INTERVAL", "30")))
+    metrics_interval = float(os.getenv("METRICS_LOG_INTERVAL", "300"))
+    metrics_task = asyncio.create_task(log_metrics(metrics_interval)) if metrics_interval > 0 else None
+    logging.info(f"Started in {time.perf_counter() - STARTED_AT:.2f}s, bookings are loading in the background")
+    try:
+        if BOT_MODE == "webhook":
+            from webhook import run_webhook
+            await run_webhook(dp, bot, os.getenv("WEBHOOK_URL"), os.getenv("WEBHOOK_PATH", "/webhook"), os.getenv("WEBHOOK_HOST", "0.0.0.0"),
+                              int(os.getenv("PORT", "8080")), os.getenv("WEBHOOK_SECRET"), os.getenv("WEBHOOK_BACKGROUND", "1") == "1",
+                              os.getenv("METRICS_TOKEN"))
+        else:
+            # A webhook left registered by an earlier webhook-mode run makes getUpdates fail.
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        warm_up_task.cancel()
+        if metrics_task is not None:
+            metrics_task.cancel()
+        await principals.stop()
+        await pending_store.stop()
+        await booking_cache.stop()
+        if SHEET_SYNC:
+            await sheet_mirror.stop()
+        booking_store.close()
+        await shared_state.bus.close()
+        await dp.storage.close()
+        logging.info(f"Sheets round-trips saved by client reuse: {sheet_client.round_trips_saved}")
+        sheet_storage.close()
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO, stream=sys.stdout)
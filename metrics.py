@@ -0,0 +1,147 @@
+import asyncio, bisect, logging, time
+from contextlib import contextmanager
+from aiogram import BaseMiddleware
+from aiogram.fsm.storage.base import BaseStorage
+from sharedState import state_name
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+class Metrics:
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def render(self):
+        # Prometheus text exposition format.
+        lines = []
+        for (name, labels), value in sorted(self.counters.items()):
+            lines.append(f"{name}{format_labels(labels)} {value}")
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            cumulative = 0
+            for bound, count in zip((*BUCKETS, "+Inf"), histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {histogram.total}")
+            lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        lines = []
+        for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: -item[1].total):
+            if histogram.count:
+                lines.append(f"{name}{format_labels(labels)} count={histogram.count} "
+                             f"mean={histogram.total / histogram.count * 1000:.1f}ms total={histogram.total:.2f}s")
+        return "\n".join(lines)
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+metrics = Metrics()
+
+class InstrumentationMiddleware(BaseMiddleware):
+    def __init__(self, update_type):
+        super().__init__()
+        self.update_type = update_type
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object is not None else "unknown"
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            metrics.observe("bot_handler_seconds", time.perf_counter() - started, handler=name, update=self.update_type)
+
+class InstrumentedStorage(BaseStorage):
+    # Wraps the FSM storage so transitions are counted from the set_state calls handlers
+    # already make, instead of reading the state again around every update.
+    def __init__(self, storage):
+        self.storage = storage
+
+    async def set_state(self, key, state=None):
+        metrics.inc("bot_fsm_transitions_total", target=state_name(state) or "none")
+        with self.timer("set_state"):
+            return await self.storage.set_state(key, state)
+
+    async def get_state(self, key):
+        with self.timer("get_state"):
+            return await self.storage.get_state(key)
+
+    async def set_data(self, key, data):
+        with self.timer("set_data"):
+            return await self.storage.set_data(key, data)
+
+    async def get_data(self, key):
+        with self.timer("get_data"):
+            return await self.storage.get_data(key)
+
+    async def close(self):
+        await self.storage.close()
+
+    @staticmethod
+    def timer(operation):
+        return metrics.timer("fsm_storage_seconds", operation=operation)
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            metrics.observe("telegram_request_seconds", time.perf_counter() - started, method=type(method).__name__)
+
+class FirstUpdateMiddleware(BaseMiddleware):
+    def __init__(self, started_at):
+        super().__init__()
+        self.started_at = started_at
+        self.seen = False
+
+    async def __call__(self, handler, event, data):
+        if not self.seen:
+            self.seen = True
+            elapsed = time.perf_counter() - self.started_at
+            metrics.observe("bot_time_to_first_update_seconds", elapsed)
+            logging.info(f"First update {event.update_id} received {elapsed:.2f}s after start")
+        return await handler(event, data)
+
+async def log_metrics(interval):
+    while True:
+        await asyncio.sleep(interval)
+        summary = metrics.summary()
+        if summary:
+            logging.info(f"Metrics summary:\n{summary}")
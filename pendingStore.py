@@ -0,0 +1,178 @@
+import asyncio, logging, pickle, sqlite3, time, uuid
+from collections import OrderedDict
+
+class PendingRequest:
+    __slots__ = ("booking_id", "data", "message_ids", "created_at")
+
+    def __init__(self, booking_id, data, message_ids=None, created_at=None):
+        self.booking_id = booking_id
+        self.data = data
+        self.message_ids = message_ids if message_ids is not None else {}
+        self.created_at = created_at if created_at is not None else time.time()
+
+    def dump(self):
+        return pickle.dumps((self.booking_id, self.data, self.message_ids, self.created_at))
+
+    @classmethod
+    def load(cls, payload):
+        return cls(*pickle.loads(payload))
+
+class MemoryBackend:
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._requests = OrderedDict()
+
+    async def get(self, booking_id):
+        return self._requests.get(booking_id)
+
+    async def put(self, request):
+        self._requests[request.booking_id] = request
+        while len(self._requests) > self.max_entries:
+            self._requests.popitem(last=False)
+
+    async def update(self, request):
+        if request.booking_id not in self._requests:
+            return False
+        self._requests[request.booking_id] = request
+        return True
+
+    async def pop(self, booking_id):
+        return self._requests.pop(booking_id, None)
+
+    async def purge(self, before):
+        expired = [key for key, request in self._requests.items() if request.created_at < before]
+        for key in expired:
+            del self._requests[key]
+        return len(expired)
+
+    async def close(self):
+        pass
+
+class SQLiteBackend:
+    # Rows are tiny and the database is local, so statements run inline rather than on a pool.
+    def __init__(self, path="pending_requests.db"):
+        self._db = sqlite3.connect(path, isolation_level=None, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pending_requests ("
+            "booking_id TEXT PRIMARY KEY, payload BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS pending_requests_created_at ON pending_requests (created_at)")
+
+    async def get(self, booking_id):
+        row = self._db.execute("SELECT payload FROM pending_requests WHERE booking_id = ?", (booking_id,)).fetchone()
+        return PendingRequest.load(row[0]) if row else None
+
+    async def put(self, request):
+        self._db.execute(
+            "INSERT OR REPLACE INTO pending_requests (booking_id, payload, created_at) VALUES (?, ?, ?)",
+            (request.booking_id, request.dump(), request.created_at),
+        )
+
+    async def update(self, request):
+        return self._db.execute("UPDATE pending_requests SET payload = ? WHERE booking_id = ?",
+                                (request.dump(), request.booking_id)).rowcount > 0
+
+    async def pop(self, booking_id):
+        row = self._db.execute("DELETE FROM pending_requests WHERE booking_id = ? RETURNING payload", (booking_id,)).fetchone()
+        return PendingRequest.load(row[0]) if row else None
+
+    async def purge(self, before):
+        return self._db.execute("DELETE FROM pending_requests WHERE created_at < ?", (before,)).rowcount
+
+    async def close(self):
+        self._db.close()
+
+class RedisBackend:
+    # Expiry is delegated to Redis key TTLs, so purge has nothing to do.
+    def __init__(self, redis, prefix="booking_bot:pending:", ttl=3 * 24 * 3600):
+        self.redis = redis
+        self.prefix = prefix
+        self.ttl = ttl
+
+    async def get(self, booking_id):
+        payload = await self.redis.get(self.prefix + booking_id)
+        return PendingRequest.load(payload) if payload else None
+
+    async def put(self, request):
+        await self.redis.set(self.prefix + request.booking_id, request.dump(), ex=int(self.ttl))
+
+    async def update(self, request):
+        return bool(await self.redis.set(self.prefix + request.booking_id, request.dump(), xx=True, keepttl=True))
+
+    async def pop(self, booking_id):
+        payload = await self.redis.getdel(self.prefix + booking_id)
+        return PendingRequest.load(payload) if payload else None
+
+    async def purge(self, before):
+        return 0
+
+    async def close(self):
+        # The connection is shared with RedisStorage, which closes it.
+        pass
+
+class PendingStore:
+    def __init__(self, backend, ttl=3 * 24 * 3600, purge_interval=600, on_purge=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self.on_purge = on_purge
+        self._task = None
+
+    async def create(self, data):
+        request = PendingRequest(str(uuid.uuid4()), data)
+        await self.backend.put(request)
+        return request
+
+    async def save(self, request):
+        # Never re-creates a request: one that was approved, rejected or expired in the meantime
+        # stays gone, and False tells the caller so.
+        return await self.backend.update(request)
+
+    async def restore(self, request):
+        # Puts back a request that was popped but could not be processed.
+        await self.backend.put(request)
+
+    async def get(self, booking_id):
+        request = await self.backend.get(booking_id)
+        if request is not None and request.created_at < time.time() - self.ttl:
+            await self.backend.pop(booking_id)
+            return None
+        return request
+
+    async def pop(self, booking_id):
+        request = await self.backend.pop(booking_id)
+        if request is not None and request.created_at < time.time() - self.ttl:
+            return None
+        return request
+
+    async def purge_expired(self):
+        before = time.time() - self.ttl
+        purged = await self.backend.purge(before)
+        if self.on_purge is not None:
+            self.on_purge(before)
+        if purged:
+            logging.info(f"Evicted {purged} expired booking requests")
+        return purged
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.backend.close()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.purge_interval)
+            try:
+                await self.purge_expired()
+            except Exception as e:
+                logging.error(f"Failed to evict expired booking requests: {e}")
@@ -0,0 +1,87 @@
+import asyncio, json, logging, os
+from dotenv import dotenv_values, find_dotenv
+
+# Imported before functions.py calls load_dotenv(), so this is the environment the process
+# was started with.
+PROCESS_ENV = frozenset(os.environ)
+
+class Principals:
+    __slots__ = ("allowed", "admins", "admin_ids")
+
+    def __init__(self, allowed_users, admin_users):
+        self.admins = {int(key): value for key, value in admin_users.items()}
+        self.admin_ids = tuple(self.admins)
+        # Admins must always be able to reach the approve/reject callbacks.
+        self.allowed = frozenset(int(user_id) for user_id in allowed_users) | frozenset(self.admins)
+
+class PrincipalRegistry:
+    # Allowlists come from ALLOWED_USERS_FILE/ADMIN_USERS_FILE when set, otherwise from the
+    # ALLOWED_USERS/ADMIN_USERS variables, re-read from the .env file when it changes. A reload
+    # builds a new Principals object and swaps it in with one assignment, so readers always
+    # see a consistent pair of sets.
+    def __init__(self, allowed_file=None, admin_file=None, env_path=None):
+        self.allowed_file = allowed_file
+        self.admin_file = admin_file
+        self.env_path = env_path if env_path is not None else find_dotenv(usecwd=True)
+        self._mtimes = {}
+        self.principals = self._load()
+        self._mtimes = self._current_mtimes()
+        self._task = None
+
+    def _watched(self):
+        return [path for path in (self.allowed_file, self.admin_file, self.env_path) if path]
+
+    def _current_mtimes(self):
+        mtimes = {}
+        for path in self._watched():
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+
+    def _read(self, path, name):
+        if path:
+            with open(path) as f:
+                return json.load(f)
+        # Same precedence as load_dotenv(): the real environment wins over the .env file. Only
+        # variables set before load_dotenv() ran count, or .env edits would never be picked up.
+        if name in PROCESS_ENV:
+            return json.loads(os.environ[name])
+        env = dotenv_values(self.env_path) if self.env_path else {}
+        return json.loads(env[name])
+
+    def _load(self):
+        return Principals(self._read(self.allowed_file, "ALLOWED_USERS"), self._read(self.admin_file, "ADMIN_USERS"))
+
+    def reload_if_changed(self):
+        mtimes = self._current_mtimes()
+        if mtimes == self._mtimes:
+            return False
+        try:
+            principals = self._load()
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"Keeping previous allowlists, reload failed: {e}")
+            return False
+        self._mtimes = mtimes
+        self.principals = principals
+        logging.info(f"Reloaded allowlists: {len(principals.allowed)} users, {len(principals.admins)} admins")
+        return True
+
+    def start(self, interval=30):
+        if self._task is None and interval > 0:
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            self.reload_if_changed()
@@ -0,0 +1,74 @@
+from collections import OrderedDict
+from datetime import date
+from functools import lru_cache
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram_calendar import SimpleCalendar
+from dataList import facility_list
+
+# Markup objects are pydantic models that are never mutated after they are sent, so one
+# instance can be shared by every update instead of being rebuilt and re-validated each time.
+@lru_cache(maxsize=256)
+def keyboard(buttons, one_time=True):
+    return ReplyKeyboardMarkup(
+        keyboard=[[KeyboardButton(text=btn) for btn in row] for row in buttons],
+        resize_keyboard=True,
+        one_time_keyboard=one_time
+    )
+
+def as_buttons(rows):
+    return tuple(tuple(row) for row in rows)
+
+ADMIN_MENU = keyboard((("New Booking", "Recurring Booking"), ("View Booking",), ("Broadcast Message",)))
+USER_MENU = keyboard((("New Booking", "Recurring Booking"), ("View Booking",)))
+FACILITY_KEYBOARD = keyboard(as_buttons(facility_list[i : i + 3] for i in range(0, len(facility_list), 3)))
+YES_NO_KEYBOARD = keyboard((("Yes", "No"),))
+FREQUENCY_KEYBOARD = keyboard((("Weekly", "Daily"),))
+
+def approval_keyboard(booking_id):
+    # Built once per request and shared by the fan-out to every admin; ids are unique, so
+    # there is nothing to memoise across requests.
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="Approve", callback_data=f"approve_{booking_id}"),
+        InlineKeyboardButton(text="Reject", callback_data=f"reject_{booking_id}")],
+    ])
+
+def summary_key(data):
+    return (data['facility'], data['date'], data['start_time'], data['end_time'], data['email'], data['name'], data['contact_number'],
+            data.get('frequency'), data.get('until'), tuple(data.get('occurrences') or ()))
+
+def booking_summary(data):
+    return render_summary(summary_key(data))
+
+@lru_cache(maxsize=1024)
+def render_summary(key):
+    facility, booking_date, start_time, end_time, email, name, contact_number, frequency, until, occurrences = key
+    schedule = ""
+    if occurrences:
+        schedule = (f"Repeats: {frequency.capitalize()} until {until.strftime('%d/%m/%Y')}\n"
+                    f"Sessions ({len(occurrences)}): {', '.join(session.strftime('%d/%m') for session in occurrences)}\n")
+    return (
+            f"Booking Details\n"
+            f"================\n"
+            f"Facility: {facility}\n"
+            f"Date: {booking_date.strftime('%d/%m/%Y')} ({booking_date.strftime('%A')})\n"
+            f"{schedule}"
+            f"Start time: {start_time}\n"
+            f"End time: {end_time}\n"
+            f"Email: {email}\n"
+            f"Name: {name}\n"
+            f"Contact Number: {contact_number}\n"
+    )
+
+_calendars = OrderedDict()
+
+async def calendar_markup(year=None, month=None, max_size=24):
+    # The month grid marks today's date, so cached markup is keyed by today as well and the
+    # previous day's entries age out of the bounded cache.
+    today = date.today()
+    key = (year or today.year, month or today.month, today)
+    markup = _calendars.get(key)
+    if markup is None:
+        markup = _calendars[key] = await SimpleCalendar().start_calendar(key[0], key[1])
+        if len(_calendars) > max_size:
+            _calendars.popitem(last=False)
+    return markup
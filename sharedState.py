@@ -0,0 +1,136 @@
+import json, logging, pickle, sqlite3
+from datetime import date, datetime, time
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
+from pendingStore import MemoryBackend, SQLiteBackend, RedisBackend
+
+def storage_key(key):
+    return ":".join(str(part) for part in (
+        key.bot_id, key.chat_id, key.user_id, getattr(key, "thread_id", None),
+        getattr(key, "business_connection_id", None), key.destiny,
+    ))
+
+def state_name(state):
+    return state.state if isinstance(state, State) else state
+
+class SQLiteStorage(BaseStorage):
+    # FSM storage in a local SQLite file so several bot processes on one host share
+    # conversation state. Data is pickled because it carries datetime/time values.
+    def __init__(self, path="bot_state.db"):
+        self._db = sqlite3.connect(path, isolation_level=None, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS fsm (key TEXT PRIMARY KEY, state TEXT, data BLOB)")
+
+    async def set_state(self, key, state=None):
+        self._db.execute(
+            "INSERT INTO fsm (key, state) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET state = excluded.state",
+            (storage_key(key), state_name(state)),
+        )
+
+    async def get_state(self, key):
+        row = self._db.execute("SELECT state FROM fsm WHERE key = ?", (storage_key(key),)).fetchone()
+        return row[0] if row else None
+
+    async def set_data(self, key, data):
+        self._db.execute(
+            "INSERT INTO fsm (key, data) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET data = excluded.data",
+            (storage_key(key), pickle.dumps(dict(data))),
+        )
+
+    async def get_data(self, key):
+        row = self._db.execute("SELECT data FROM fsm WHERE key = ?", (storage_key(key),)).fetchone()
+        return pickle.loads(row[0]) if row and row[0] is not None else {}
+
+    async def close(self):
+        self._db.close()
+
+def json_dumps(value):
+    def encode(obj):
+        if isinstance(obj, datetime):
+            return {"__datetime__": obj.isoformat()}
+        if isinstance(obj, date):
+            return {"__date__": obj.isoformat()}
+        if isinstance(obj, time):
+            return {"__time__": obj.isoformat()}
+        raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+    return json.dumps(value, default=encode)
+
+def json_loads(value):
+    def decode(obj):
+        if "__datetime__" in obj:
+            return datetime.fromisoformat(obj["__datetime__"])
+        if "__date__" in obj:
+            return date.fromisoformat(obj["__date__"])
+        if "__time__" in obj:
+            return time.fromisoformat(obj["__time__"])
+        return obj
+    return json.loads(value, object_hook=decode)
+
+class LocalBus:
+    async def version(self):
+        return 0
+
+    async def bump(self):
+        pass
+
+    async def close(self):
+        pass
+
+class SQLiteBus:
+    def __init__(self, path="bot_state.db"):
+        self._db = sqlite3.connect(path, isolation_level=None, timeout=10)
+        self._db.execute("CREATE TABLE IF NOT EXISTS bus (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+        self._db.execute("INSERT OR IGNORE INTO bus (name, version) VALUES ('bookings', 0)")
+
+    async def version(self):
+        return self._db.execute("SELECT version FROM bus WHERE name = 'bookings'").fetchone()[0]
+
+    async def bump(self):
+        self._db.execute("UPDATE bus SET version = version + 1 WHERE name = 'bookings'")
+
+    async def close(self):
+        self._db.close()
+
+class RedisBus:
+    def __init__(self, redis, key="booking_bot:bookings_version"):
+        self.redis = redis
+        self.key = key
+
+    async def version(self):
+        return int(await self.redis.get(self.key) or 0)
+
+    async def bump(self):
+        await self.redis.incr(self.key)
+
+    async def close(self):
+        # The connection is shared with RedisStorage, which closes it.
+        pass
+
+class SharedState:
+    __slots__ = ("fsm_storage", "pending_backend", "bus")
+
+    def __init__(self, fsm_storage, pending_backend, bus):
+        self.fsm_storage = fsm_storage
+        self.pending_backend = pending_backend
+        self.bus = bus
+
+def build_shared_state(backend="local", db_path="bot_state.db", redis_url=None, pending_store="sqlite", pending_db_path="pending_requests.db",
+                       pending_ttl=3 * 24 * 3600):
+    # "local" keeps everything in this process (pending requests still survive restarts);
+    # "sqlite" shares one database file between workers on the same host; "redis" shares FSM
+    # and pending state between workers anywhere. Bookings themselves live in the
+    # BOOKING_DB_PATH SQLite file, whose write transaction is the final double-booking check,
+    # so workers must share that file: running workers on several hosts is not supported.
+    if backend == "redis":
+        logging.warning("STATE_BACKEND=redis: double bookings are only prevented between workers sharing one BOOKING_DB_PATH")
+        from redis.asyncio import Redis
+        from aiogram.fsm.storage.redis import RedisStorage
+        redis = Redis.from_url(redis_url)
+        logging.info("Using Redis for FSM, pending requests and cache invalidation")
+        return SharedState(RedisStorage(redis, json_dumps=json_dumps, json_loads=json_loads), RedisBackend(redis, ttl=pending_ttl), RedisBus(redis))
+    if backend == "sqlite":
+        logging.info(f"Using SQLite at {db_path} for FSM, pending requests and cache invalidation")
+        return SharedState(SQLiteStorage(db_path), SQLiteBackend(db_path), SQLiteBus(db_path))
+    pending_backend = SQLiteBackend(pending_db_path) if pending_store == "sqlite" else MemoryBackend()
+    return SharedState(MemoryStorage(), pending_backend, LocalBus())
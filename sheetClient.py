@@ -0,0 +1,38 @@
+import json, logging, threading
+
+# Opening a worksheet from scratch costs an OAuth token exchange plus the
+# open_by_key and worksheet() metadata fetches.
+ROUND_TRIPS_PER_OPEN = 3
+
+class SheetClient:
+    # gspread and google-auth are imported, and the credentials JSON parsed, on the first
+    # open rather than at startup, which happens off the event loop in a Sheets worker thread.
+    def __init__(self, credentials, key_id, worksheet_name="Booking_Details"):
+        self.credentials = credentials
+        self.key_id = key_id
+        self.worksheet_name = worksheet_name
+        self.round_trips_saved = 0
+        self._lock = threading.Lock()
+        self._client = None
+        self._spreadsheet = None
+        self._worksheet = None
+
+    def worksheet(self):
+        with self._lock:
+            if self._worksheet is None:
+                import gspread
+                credentials = json.loads(self.credentials) if isinstance(self.credentials, str) else self.credentials
+                self._client = gspread.service_account_from_dict(credentials)
+                self._spreadsheet = self._client.open_by_key(self.key_id)
+                self._worksheet = self._spreadsheet.worksheet(self.worksheet_name)
+                logging.info(f"Opened worksheet {self.worksheet_name}")
+            else:
+                # The authorized session refreshes an expired token on its next request, so reuse
+                # only saves the token exchange while the token is still valid.
+                valid = self._client.http_client.auth.valid
+                self.round_trips_saved += ROUND_TRIPS_PER_OPEN if valid else ROUND_TRIPS_PER_OPEN - 1
+            return self._worksheet
+
+    def spreadsheet(self):
+        self.worksheet()
+        return self._spreadsheet
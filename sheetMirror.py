@@ -0,0 +1,173 @@
+import asyncio, logging, time
+from collections import Counter
+from bookingIndex import booking_key
+
+class SheetMirror:
+    # Keeps the booking sheet in step with the BookingStore: outbox entries are pushed in
+    # batches (one batch_update for deletions, one append for new rows), and edits made by
+    # hand in the sheet are pulled back whenever its revision changes.
+    def __init__(self, booking_store, sheet_storage, max_batch=20, flush_interval=5.0, import_interval=60, bus=None):
+        self.booking_store = booking_store
+        self.sheet_storage = sheet_storage
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.import_interval = import_interval
+        self.bus = bus
+        self._sheet_revision = None
+        self._imported_at = None
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return self.booking_store.outbox_size()
+
+    async def extend(self, rows):
+        await asyncio.to_thread(self.booking_store.insert, rows)
+        self._changed()
+
+    async def delete(self, row):
+        if await asyncio.to_thread(self.booking_store.delete, row):
+            self._changed()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def sync(self):
+        await self.flush()
+        try:
+            await self.import_edits()
+        except Exception as e:
+            logging.error(f"Could not import booking sheet edits: {e}")
+
+    async def flush(self):
+        async with self._lock:
+            entries = self.booking_store.outbox()
+            if not entries:
+                return
+            try:
+                in_flight = set(self.booking_store.in_flight())
+                if in_flight:
+                    entries = await self._skip_written(entries, in_flight)
+                # An append and a later delete of the same booking cancel out before reaching the sheet.
+                appends, deletes, cancelled = {}, [], []
+                for seq, op, row in entries:
+                    key = booking_key(row)
+                    if op == "append":
+                        appends.setdefault(key, []).append((seq, row))
+                    elif appends.get(key):
+                        cancelled.extend((seq, appends[key].pop()[0]))
+                    else:
+                        deletes.append((seq, row))
+                appends = sorted(entry for pending in appends.values() for entry in pending)
+                # When the sheet holds nothing the last import has not seen, its revision after
+                # these writes is recorded too, so the bot's own writes do not trigger a re-import.
+                seen = bool(deletes or appends) and self._sheet_revision is not None and await self._revision() == self._sheet_revision
+                if deletes:
+                    await self._flush_deletes([row for _, row in deletes])
+                self.booking_store.ack([seq for seq, _ in deletes] + cancelled)
+                if appends:
+                    # Recorded before sending: a timed-out append keeps running in its worker
+                    # thread and may still land, so the retry checks the sheet first.
+                    self.booking_store.set_in_flight([seq for seq, _ in appends])
+                    await self.sheet_storage.append_rows([row for _, row in appends], value_input_option="USER_ENTERED")
+                    self.booking_store.ack([seq for seq, _ in appends])
+                    self.booking_store.set_in_flight([])
+                if seen:
+                    self._sheet_revision = await self._revision()
+                logging.info(f"Mirrored {len(appends)} appends and {len(deletes)} deletions to the booking sheet")
+                if self.bus is not None:
+                    await self.bus.bump()
+            except Exception as e:
+                logging.error(f"Failed to mirror booking changes to the sheet, will retry: {e}")
+
+    async def _skip_written(self, entries, in_flight):
+        # Appends from an interrupted batch that did land are acknowledged instead of re-sent;
+        # the rest are safe to send (or cancel) again.
+        present = Counter(booking_key(row) for row in (await self.sheet_storage.get_all_values())[1:])
+        remaining, written = [], []
+        for seq, op, row in entries:
+            key = booking_key(row)
+            if op == "append" and seq in in_flight and present[key]:
+                present[key] -= 1
+                written.append(seq)
+            else:
+                remaining.append((seq, op, row))
+        if written:
+            logging.info(f"{len(written)} booking rows from an interrupted append were already in the sheet")
+            self.booking_store.ack(written)
+        self.booking_store.set_in_flight([])
+        return remaining
+
+    async def _flush_deletes(self, deletes):
+        values = await self.sheet_storage.get_all_values()
+        wanted = {}
+        for row in deletes:
+            key = booking_key(row)
+            wanted[key] = wanted.get(key, 0) + 1
+        row_numbers = []
+        for i, row in enumerate(values[1:], start=2):
+            key = booking_key(row)
+            if wanted.get(key):
+                wanted[key] -= 1
+                row_numbers.append(i)
+        if row_numbers:
+            await self.sheet_storage.batch_delete_rows(row_numbers)
+
+    async def _revision(self):
+        try:
+            return await self.sheet_storage.get_revision()
+        except Exception as e:
+            # The revision comes from the Drive API, which may not be enabled; without it the
+            # sheet is downloaded and compared every time.
+            logging.warning(f"Could not read the booking sheet revision: {e}")
+            return None
+
+    async def import_edits(self):
+        # Skipped while local changes are still queued: the sheet is behind the store then, and
+        # the next flush would otherwise be undone.
+        async with self._lock:
+            self._imported_at = time.monotonic()
+            if self.booking_store.outbox_size():
+                return False
+            revision = await self._revision()
+            if revision is not None and revision == self._sheet_revision:
+                return False
+            values = await self.sheet_storage.get_all_values()
+            result = await asyncio.to_thread(self.booking_store.import_rows, values)
+            if result is None:
+                return False
+            self._sheet_revision = revision
+            added, removed = result
+            if added or removed:
+                logging.info(f"Imported booking sheet edits: {added} rows added, {removed} rows removed")
+            return True
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+            if self._imported_at is None or time.monotonic() - self._imported_at >= self.import_interval:
+                try:
+                    await self.import_edits()
+                except Exception as e:
+                    logging.error(f"Could not import booking sheet edits: {e}")
+
+    def _changed(self):
+        if len(self) >= self.max_batch:
+            self._wake.set()
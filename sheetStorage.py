@@ -0,0 +1,56 @@
+import asyncio, time
+from concurrent.futures import ThreadPoolExecutor
+from metrics import metrics
+
+class SheetStorage:
+    # gspread is synchronous, so every call runs on a small dedicated pool and the event loop
+    # keeps dispatching updates while a request is in flight. A timed-out call is abandoned,
+    # not interrupted: its worker thread finishes in the background.
+    def __init__(self, sheet_client, max_workers=4, timeout=30):
+        self.sheet_client = sheet_client
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sheets")
+
+    async def _run(self, method, *args, **kwargs):
+        def call():
+            return getattr(self.sheet_client.worksheet(), method)(*args, **kwargs)
+        return await self._call(call, method)
+
+    async def _call(self, func, operation):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(self._executor, func), self.timeout)
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            raise
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            metrics.observe("sheets_request_seconds", time.perf_counter() - started, operation=operation)
+            metrics.inc("sheets_requests_total", operation=operation, outcome=outcome)
+
+    async def get_all_values(self):
+        return await self._run("get_all_values")
+
+    async def get_revision(self):
+        return await self._call(lambda: self.sheet_client.spreadsheet().get_lastUpdateTime(), "get_lastUpdateTime")
+
+    async def append_rows(self, rows, value_input_option="USER_ENTERED"):
+        return await self._run("append_rows", rows, value_input_option=value_input_option)
+
+    async def batch_delete_rows(self, row_numbers):
+        # One batchUpdate for all rows; deleting bottom-up keeps the remaining numbers valid.
+        def call():
+            sheet_id = self.sheet_client.worksheet().id
+            requests = [
+                {"deleteDimension": {"range": {"sheetId": sheet_id, "dimension": "ROWS", "startIndex": n - 1, "endIndex": n}}}
+                for n in sorted(set(row_numbers), reverse=True)
+            ]
+            return self.sheet_client.spreadsheet().batch_update({"requests": requests})
+        return await self._call(call, "batch_update")
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
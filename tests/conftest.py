@@ -0,0 +1,53 @@
+import asyncio, os, sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HEADER = ["User ID", "Facility", "Date", "Start Time", "End Time", "Time Period", "Email", "Name", "Contact Number"]
+
+def booking_row(facility="Gym", date="10/21/2026", start="10:00", end="11:00", email="a@example.com", user_id=1):
+    return [user_id, facility, date, start, end, f"{start}-{end}", email, f"User {user_id}", "91234567"]
+
+class FakeSheetStorage:
+    # Async stand-in for SheetStorage backed by a list of rows. fail_after_append makes the
+    # next append land and then time out, like an abandoned worker-thread call.
+    def __init__(self, rows=()):
+        self.values = [list(HEADER), *([str(value) for value in row] for row in rows)]
+        self.revision = 0
+        self.calls = []
+        self.fail_after_append = False
+        self.fail_before_append = False
+
+    async def get_all_values(self):
+        self.calls.append("get_all_values")
+        return [list(row) for row in self.values]
+
+    async def get_revision(self):
+        return self.revision
+
+    async def append_rows(self, rows, value_input_option="USER_ENTERED"):
+        self.calls.append("append_rows")
+        if self.fail_before_append:
+            self.fail_before_append = False
+            raise asyncio.TimeoutError()
+        self.values.extend([str(value) for value in row] for row in rows)
+        self.revision += 1
+        if self.fail_after_append:
+            self.fail_after_append = False
+            raise asyncio.TimeoutError()
+
+    async def batch_delete_rows(self, row_numbers):
+        self.calls.append("batch_delete_rows")
+        for n in sorted(set(row_numbers), reverse=True):
+            del self.values[n - 1]
+        self.revision += 1
+
+    def data_rows(self):
+        return self.values[1:]
+
+@pytest.fixture
+def store(tmp_path):
+    from bookingStore import BookingStore
+    booking_store = BookingStore(str(tmp_path / "bookings.db"))
+    yield booking_store
+    booking_store.close()
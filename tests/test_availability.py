@@ -0,0 +1,46 @@
+from datetime import datetime, time
+from availability import AvailabilityEngine
+from bookingGuard import BookingGuard
+from bookingIndex import BookingIndex
+from conftest import booking_row
+
+class Cache:
+    def __init__(self, *rows):
+        self.index = BookingIndex.from_rows(rows)
+
+def test_free_windows_on_an_empty_day_start_at_opening():
+    engine = AvailabilityEngine(Cache(), ("07:00", "23:00"))
+    assert engine.free_windows("Gym", "10/21/2026", 60, 3) == [(time(7), time(8)), (time(8), time(9)), (time(9), time(10))]
+
+def test_free_windows_skip_bookings_and_closing_time():
+    engine = AvailabilityEngine(Cache(booking_row(start="07:00", end="09:15"), booking_row(start="10:00", end="22:30")), ("07:00", "23:00"))
+    # 09:15-10:00 is too short for an hour and 22:30-23:00 ends at closing.
+    assert engine.free_windows("Gym", "10/21/2026", 60, 5) == []
+    assert engine.free_windows("Gym", "10/21/2026", 45, 5) == [(time(9, 15), time(10))]
+    assert engine.free_windows("Pool", "10/21/2026", 60, 1) == [(time(7), time(8))]
+
+def test_free_windows_round_lengths_up_to_whole_slots():
+    engine = AvailabilityEngine(Cache(booking_row(start="07:00", end="08:00")), ("07:00", "09:00"))
+    assert engine.free_windows("Gym", "10/21/2026", 50, 2) == [(time(8), time(9))]
+
+def test_free_windows_today_start_after_now():
+    engine = AvailabilityEngine(Cache(), ("07:00", "23:00"))
+    now = datetime(2026, 10, 21, 14, 5)
+    assert engine.free_windows("Gym", "10/21/2026", 30, 1, now) == [(time(14, 15), time(14, 45))]
+    assert engine.free_windows("Gym", "10/22/2026", 30, 1, now) == [(time(7), time(7, 30))]
+
+def test_held_slots_are_not_offered():
+    cache = Cache()
+    guard = BookingGuard(cache)
+    engine = AvailabilityEngine(cache, ("07:00", "23:00"), guard)
+    assert engine.free_windows("Gym", "10/21/2026", 60, 4)[3] == (time(10), time(11))
+    guard.hold("request", [booking_row(start="10:00", end="11:00")])
+    assert (time(10), time(11)) not in engine.free_windows("Gym", "10/21/2026", 60, 10)
+    assert engine.free_slots("Gym", "10/21/2026") == [(time(7), time(10)), (time(11), time(23))]
+    guard.release("request")
+    assert engine.free_slots("Gym", "10/21/2026") == [(time(7), time(23))]
+
+def test_ranges_ending_at_midnight_are_offered():
+    engine = AvailabilityEngine(Cache(booking_row(start="10:00", end="11:00")))
+    assert engine.free_slots("Gym", "10/21/2026") == [(time(0), time(10)), (time(11), time(23, 59))]
+    assert engine.free_windows("Gym", "10/21/2026", 60, 30)[-1] == (time(23), time(23, 59))
@@ -0,0 +1,47 @@
+import asyncio
+from datetime import time
+from bookingGuard import BookingGuard
+from bookingIndex import BookingIndex
+from conftest import booking_row
+
+class Cache:
+    def __init__(self, *rows):
+        self.index = BookingIndex.from_rows(rows)
+
+def test_conflicts_come_from_bookings_and_holds():
+    guard = BookingGuard(Cache(booking_row(start="08:00", end="09:00")))
+    assert guard.find_conflict("Gym", "10/21/2026", time(8, 30), time(9, 30)).row[3] == "08:00"
+    assert guard.find_conflict("Gym", "10/21/2026", time(10), time(11)) is None
+    guard.hold("request", [booking_row(start="10:00", end="11:00")])
+    assert guard.find_conflict("Gym", "10/21/2026", time(10, 30), time(11)).row[3] == "10:00"
+    guard.release("request")
+    assert guard.find_conflict("Gym", "10/21/2026", time(10), time(11)) is None
+
+def test_purge_releases_only_expired_holds():
+    guard = BookingGuard(Cache())
+    guard.hold("old", [booking_row(start="10:00", end="11:00")])
+    guard._hold_rows["old"] = (guard._hold_rows["old"][0], 0)
+    guard.hold("new", [booking_row(start="12:00", end="13:00")])
+    guard.purge(1)
+    assert guard.find_conflict("Gym", "10/21/2026", time(10), time(11)) is None
+    assert guard.find_conflict("Gym", "10/21/2026", time(12), time(13)) is not None
+
+def test_completed_ids_are_bounded():
+    guard = BookingGuard(Cache(), completed_size=2)
+    for booking_id in ("a", "b", "c"):
+        guard.complete(booking_id)
+    assert not guard.is_completed("a")
+    assert guard.is_completed("b") and guard.is_completed("c")
+
+def test_overlapping_series_are_serialised():
+    guard = BookingGuard(Cache())
+    events = []
+    async def write(name, dates):
+        async with guard.lock("Gym", dates):
+            events.append(f"{name} start")
+            await asyncio.sleep(0.01)
+            events.append(f"{name} end")
+    async def scenario():
+        await asyncio.gather(write("first", ["10/21/2026", "10/28/2026"]), write("second", ["10/28/2026", "10/21/2026"]))
+    asyncio.run(scenario())
+    assert events == ["first start", "first end", "second start", "second end"]
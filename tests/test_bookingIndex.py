@@ -0,0 +1,47 @@
+import random
+from datetime import time
+from bookingIndex import BookingIndex, BookingRecord, DaySchedule
+from conftest import booking_row
+
+def schedule(*ranges):
+    day = DaySchedule()
+    for start, end in ranges:
+        day.insert(BookingRecord(booking_row(start=start, end=end)))
+    return day
+
+def test_touching_bookings_do_not_conflict():
+    day = schedule(("10:00", "11:00"))
+    assert day.find_conflict(time(11), time(12)) is None
+    assert day.find_conflict(time(9), time(10)) is None
+    assert day.find_conflict(time(10, 59), time(12)).row[3] == "10:00"
+
+def test_long_earlier_booking_is_found_past_shorter_later_ones():
+    day = schedule(("08:00", "18:00"), ("09:00", "09:30"), ("10:00", "10:30"))
+    assert day.find_conflict(time(12), time(13)).row[3:5] == ["08:00", "18:00"]
+
+def test_find_conflict_matches_brute_force():
+    rng = random.Random(7)
+    for _ in range(200):
+        day, ranges = DaySchedule(), []
+        for _ in range(rng.randint(0, 12)):
+            start = rng.randint(0, 94)
+            end = rng.randint(start + 1, 95)
+            ranges.append((start, end))
+            day.insert(BookingRecord(booking_row(start=f"{start // 4:02d}:{start % 4 * 15:02d}", end=f"{end // 4:02d}:{end % 4 * 15:02d}")))
+        for _ in range(20):
+            start = rng.randint(0, 94)
+            end = rng.randint(start + 1, 95)
+            expected = any(s < end and start < e for s, e in ranges)
+            found = day.find_conflict(time(start // 4, start % 4 * 15), time(end // 4, end % 4 * 15))
+            assert (found is not None) == expected
+
+def test_removed_booking_no_longer_conflicts():
+    index = BookingIndex()
+    row = booking_row()
+    index.add(row)
+    version = index.day("Gym", "10/21/2026").version
+    assert index.find_conflict("Gym", "10/21/2026", time(10, 30), time(10, 45)) is not None
+    index.remove(row)
+    assert index.find_conflict("Gym", "10/21/2026", time(10, 30), time(10, 45)) is None
+    assert index.day("Gym", "10/21/2026") is None
+    assert version > 0
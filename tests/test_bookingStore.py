@@ -0,0 +1,66 @@
+import pytest
+from bookingStore import BookingStore, BookingConflict
+from conftest import HEADER, booking_row
+
+def test_import_into_empty_store_adds_every_sheet_row(store):
+    rows = [booking_row(), booking_row(facility="Pool")]
+    assert store.import_rows([HEADER, *[[str(v) for v in row] for row in rows]]) == (2, 0)
+    assert store.rows()[0] == HEADER
+    assert [row[1] for row in store.rows()[1:]] == ["Gym", "Pool"]
+    assert store.outbox_size() == 0
+
+def test_import_applies_manual_additions_and_deletions(store):
+    store.import_rows([HEADER, [str(v) for v in booking_row()], [str(v) for v in booking_row(start="12:00", end="13:00")]])
+    revision = store.revision()
+    edited = [HEADER, [str(v) for v in booking_row(start="12:00", end="13:00")], [str(v) for v in booking_row(facility="Hall")]]
+    assert store.import_rows(edited) == (1, 1)
+    assert sorted((row[1], row[3]) for row in store.rows()[1:]) == [("Gym", "12:00"), ("Hall", "10:00")]
+    assert store.revision() > revision
+
+def test_import_is_a_no_op_when_sheet_matches_store(store):
+    store.insert([booking_row()])
+    store.ack([seq for seq, _, _ in store.outbox()])
+    revision = store.revision()
+    # The sheet returns strings and pads short rows; neither counts as an edit.
+    assert store.import_rows([HEADER, [str(v) for v in booking_row()] + ["", ""]]) == (0, 0)
+    assert store.revision() == revision
+
+def test_import_keeps_duplicate_rows_as_counted(store):
+    row = [str(v) for v in booking_row()]
+    assert store.import_rows([HEADER, row, row]) == (2, 0)
+    assert store.import_rows([HEADER, row]) == (0, 1)
+    assert len(store) == 1
+
+def test_import_is_skipped_while_changes_are_queued(store):
+    store.insert([booking_row()])
+    assert store.import_rows([HEADER]) is None
+    assert len(store) == 1
+
+def test_insert_rejects_overlap_seen_by_another_connection(tmp_path):
+    path = str(tmp_path / "bookings.db")
+    first, second = BookingStore(path), BookingStore(path)
+    first.insert([booking_row()])
+    with pytest.raises(BookingConflict) as conflict:
+        second.insert([booking_row(start="10:30", end="11:30", email="b@example.com", user_id=2)])
+    assert conflict.value.existing[3:5] == ["10:00", "11:00"]
+    second.insert([booking_row(start="11:00", end="12:00", email="b@example.com", user_id=2)])
+    second.insert([booking_row(facility="Pool", email="b@example.com", user_id=2)])
+    assert len(first) == 3
+    assert first.outbox_size() == 3
+
+def test_rejected_series_writes_nothing(store):
+    store.insert([booking_row(date="10/28/2026")])
+    with pytest.raises(BookingConflict):
+        store.insert([booking_row(date="10/21/2026"), booking_row(date="10/28/2026")])
+    assert len(store) == 1
+    assert store.outbox_size() == 1
+
+def test_store_counts_as_imported_only_after_a_sheet_import(store):
+    store.import_journal("missing.json")
+    store.insert([booking_row()])
+    assert not store.imported()
+    assert store.import_rows([HEADER]) is None
+    assert not store.imported()
+    store.ack([seq for seq, _, _ in store.outbox()])
+    assert store.import_rows([HEADER, [str(v) for v in booking_row()]]) == (0, 0)
+    assert store.imported()
@@ -0,0 +1,27 @@
+import asyncio
+import pytest
+from pendingStore import MemoryBackend, PendingStore, SQLiteBackend
+
+@pytest.fixture(params=["memory", "sqlite"])
+def pending_store(request, tmp_path):
+    backend = MemoryBackend() if request.param == "memory" else SQLiteBackend(str(tmp_path / "pending.db"))
+    store = PendingStore(backend)
+    yield store
+    asyncio.run(backend.close())
+
+def test_save_records_message_ids_of_a_pending_request(pending_store):
+    async def scenario():
+        request = await pending_store.create({"facility": "Gym"})
+        request.message_ids = {1: 10, 2: 20}
+        assert await pending_store.save(request)
+        return (await pending_store.pop(request.booking_id)).message_ids
+    assert asyncio.run(scenario()) == {1: 10, 2: 20}
+
+def test_save_does_not_recreate_a_handled_request(pending_store):
+    async def scenario():
+        request = await pending_store.create({"facility": "Gym"})
+        assert await pending_store.pop(request.booking_id) is not None
+        request.message_ids = {1: 10}
+        assert not await pending_store.save(request)
+        return await pending_store.pop(request.booking_id)
+    assert asyncio.run(scenario()) is None
@@ -0,0 +1,124 @@
+import asyncio
+from sheetMirror import SheetMirror
+from conftest import FakeSheetStorage, booking_row
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_flush_sends_queued_rows_in_one_append(store):
+    sheet = FakeSheetStorage()
+    mirror = SheetMirror(store, sheet)
+    run(mirror.extend([booking_row(date="10/21/2026"), booking_row(date="10/28/2026")]))
+    run(mirror.flush())
+    assert sheet.calls == ["append_rows"]
+    assert len(sheet.data_rows()) == 2
+    assert len(mirror) == 0
+
+def test_append_and_delete_of_unsent_row_cancel_out(store):
+    sheet = FakeSheetStorage()
+    mirror = SheetMirror(store, sheet)
+    row = booking_row()
+    run(mirror.extend([row]))
+    run(mirror.delete(row))
+    run(mirror.flush())
+    assert sheet.calls == []
+    assert sheet.data_rows() == []
+    assert len(mirror) == 0 and len(store) == 0
+
+def test_delete_of_mirrored_row_removes_it_from_sheet(store):
+    sheet = FakeSheetStorage()
+    mirror = SheetMirror(store, sheet)
+    keep, cancel = booking_row(), booking_row(start="12:00", end="13:00")
+    run(mirror.extend([keep, cancel]))
+    run(mirror.flush())
+    run(mirror.delete(cancel))
+    run(mirror.flush())
+    assert [row[3] for row in sheet.data_rows()] == ["10:00"]
+    assert len(mirror) == 0
+
+def test_retry_after_timed_out_append_that_landed_does_not_duplicate(store):
+    sheet = FakeSheetStorage()
+    sheet.fail_after_append = True
+    mirror = SheetMirror(store, sheet)
+    run(mirror.extend([booking_row()]))
+    run(mirror.flush())
+    assert len(mirror) == 1
+    run(mirror.sync())
+    assert len(sheet.data_rows()) == 1
+    assert len(mirror) == 0
+    assert len(store) == 1
+
+def test_retry_after_append_that_never_landed_sends_it_once(store):
+    sheet = FakeSheetStorage()
+    sheet.fail_before_append = True
+    mirror = SheetMirror(store, sheet)
+    run(mirror.extend([booking_row()]))
+    run(mirror.flush())
+    run(mirror.flush())
+    assert len(sheet.data_rows()) == 1
+    assert len(mirror) == 0
+
+def test_delete_after_interrupted_append(store):
+    sheet = FakeSheetStorage()
+    sheet.fail_after_append = True
+    mirror = SheetMirror(store, sheet)
+    row = booking_row()
+    run(mirror.extend([row]))
+    run(mirror.flush())
+    run(mirror.delete(row))
+    run(mirror.flush())
+    assert sheet.data_rows() == []
+    assert len(mirror) == 0
+
+def test_import_picks_up_manual_sheet_edits(store):
+    sheet = FakeSheetStorage([booking_row(facility="Hall")])
+    mirror = SheetMirror(store, sheet)
+    run(mirror.sync())
+    assert [row[1] for row in store.rows()[1:]] == ["Hall"]
+    sheet.values.append([str(v) for v in booking_row(facility="Pool")])
+    sheet.revision += 1
+    assert run(mirror.import_edits())
+    assert sorted(row[1] for row in store.rows()[1:]) == ["Hall", "Pool"]
+    assert not run(mirror.import_edits())
+
+def test_failed_first_import_leaves_store_unimported(store):
+    sheet = FakeSheetStorage([booking_row()])
+    async def unavailable():
+        raise ConnectionError("Sheets is down")
+    sheet.get_all_values = unavailable
+    mirror = SheetMirror(store, sheet)
+    run(mirror.sync())
+    assert not store.imported()
+    del sheet.get_all_values
+    run(mirror.sync())
+    assert store.imported() and len(store) == 1
+
+def test_import_runs_without_a_sheet_revision(store):
+    sheet = FakeSheetStorage([booking_row()])
+    async def drive_disabled():
+        raise PermissionError("Drive API has not been enabled")
+    sheet.get_revision = drive_disabled
+    mirror = SheetMirror(store, sheet)
+    assert run(mirror.import_edits())
+    assert store.imported() and len(store) == 1
+
+def test_own_writes_do_not_trigger_a_reimport(store):
+    sheet = FakeSheetStorage()
+    mirror = SheetMirror(store, sheet)
+    run(mirror.sync())
+    run(mirror.extend([booking_row()]))
+    run(mirror.flush())
+    sheet.calls.clear()
+    assert not run(mirror.import_edits())
+    assert "get_all_values" not in sheet.calls
+
+def test_manual_edit_before_a_flush_is_still_imported(store):
+    sheet = FakeSheetStorage()
+    mirror = SheetMirror(store, sheet)
+    run(mirror.sync())
+    sheet.values.append([str(v) for v in booking_row(facility="Hall")])
+    sheet.revision += 1
+    run(mirror.extend([booking_row()]))
+    run(mirror.flush())
+    assert run(mirror.import_edits())
+    assert sorted(row[1] for row in store.rows()[1:]) == ["Gym", "Hall"]
@@ -0,0 +1,69 @@
+import asyncio, logging, unicodedata
+from collections import OrderedDict
+from functools import lru_cache
+
+@lru_cache(maxsize=8192)
+def normalise_email(email):
+    # Key used to index bookings by email: the same address typed with different case,
+    # surrounding spaces or Unicode composition maps to one entry.
+    return unicodedata.normalize("NFC", str(email).strip()).lower()
+
+@lru_cache(maxsize=4096)
+def check_email_syntax(email):
+    from email_validator import validate_email, EmailNotValidError
+    try:
+        return validate_email(email, check_deliverability=False).normalized
+    except EmailNotValidError as e:
+        logging.info(f"Rejected email {email!r}: {e}")
+        return None
+
+class EmailValidator:
+    # Syntax is checked offline and memoised. With check_dns the domain must also resolve to
+    # an MX (or A) record; lookups use dnspython's async resolver with a timeout, results are
+    # kept in a bounded LRU, and a lookup that times out or finds no working nameserver lets
+    # the address through uncached; only NXDOMAIN is cached as a negative.
+    def __init__(self, check_dns=False, dns_timeout=2.0, cache_size=4096):
+        self.check_dns = check_dns
+        self.dns_timeout = dns_timeout
+        self.cache_size = cache_size
+        self._domains = OrderedDict()
+
+    async def validate(self, email):
+        normalized = check_email_syntax(str(email).strip())
+        if normalized is None or not self.check_dns:
+            return normalized
+        return normalized if await self.domain_exists(normalized.rsplit("@", 1)[1]) else None
+
+    async def domain_exists(self, domain):
+        exists = self._domains.get(domain)
+        if exists is not None:
+            self._domains.move_to_end(domain)
+            return exists
+        try:
+            exists, definite = await asyncio.wait_for(self._resolve(domain), self.dns_timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"DNS lookup for {domain} failed, accepting the address")
+            return True
+        if not definite:
+            return exists
+        self._domains[domain] = exists
+        if len(self._domains) > self.cache_size:
+            self._domains.popitem(last=False)
+        return exists
+
+    async def _resolve(self, domain):
+        import dns.asyncresolver, dns.exception, dns.resolver
+        for record_type in ("MX", "A"):
+            try:
+                await dns.asyncresolver.resolve(domain, record_type, lifetime=self.dns_timeout)
+                return True, True
+            except dns.resolver.NoAnswer:
+                continue
+            except dns.resolver.NXDOMAIN:
+                return False, True
+            except (dns.exception.Timeout, dns.resolver.NoNameservers):
+                # Every server failed or did not answer: nothing is known about the domain.
+                raise asyncio.TimeoutError
+        # The domain exists but publishes no mail or address records; that can be a transient
+        # zone problem, so the rejection is not remembered.
+        return False, False
@@ -0,0 +1,57 @@
+import asyncio, hmac, logging
+from collections import OrderedDict
+from aiohttp import web
+from aiogram import BaseMiddleware
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from metrics import metrics
+
+class UpdateDeduplicator(BaseMiddleware):
+    # Telegram re-delivers a webhook update when the response is slow or lost; remember the
+    # most recent update ids and drop repeats before they reach any handler.
+    def __init__(self, max_size=10000):
+        super().__init__()
+        self.max_size = max_size
+        self.duplicates = 0
+        self._seen = OrderedDict()
+
+    async def __call__(self, handler, event, data):
+        if event.update_id in self._seen:
+            self.duplicates += 1
+            logging.info(f"Dropping duplicate update {event.update_id}")
+            return
+        self._seen[event.update_id] = None
+        if len(self._seen) > self.max_size:
+            self._seen.popitem(last=False)
+        return await handler(event, data)
+
+def metrics_handler(token):
+    # The webhook port is public, so the metrics are only served with "Authorization: Bearer <token>".
+    async def handler(request):
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            raise web.HTTPUnauthorized()
+        return web.Response(text=metrics.render(), content_type="text/plain")
+    return handler
+
+def build_app(dp, bot, path="/webhook", secret=None, handle_in_background=True, metrics_token=None):
+    dp.update.outer_middleware(UpdateDeduplicator())
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=secret, handle_in_background=handle_in_background).register(app, path=path)
+    if metrics_token:
+        app.router.add_get("/metrics", metrics_handler(metrics_token))
+    setup_application(app, dp, bot=bot)
+    return app
+
+async def run_webhook(dp, bot, base_url, path="/webhook", host="0.0.0.0", port=8080, secret=None, handle_in_background=True, metrics_token=None):
+    async def on_startup(bot):
+        await bot.set_webhook(f"{base_url.rstrip('/')}{path}", secret_token=secret, allowed_updates=dp.resolve_used_update_types())
+        logging.info(f"Webhook registered at {base_url.rstrip('/')}{path}")
+
+    dp.startup.register(on_startup)
+    runner = web.AppRunner(build_app(dp, bot, path, secret, handle_in_background, metrics_token))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f"Serving webhook on {host}:{port}{path}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()